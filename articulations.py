@@ -1,6 +1,11 @@
+import argparse
+import files
+import instrumentation
 import json
+import multiprocessing
 import request
-import sys
+import threading
+import time
 
 from classes import (
     Conjunction,
@@ -14,10 +19,41 @@ from classes import (
     ReceivingRequirement,
     ReceivingItem
 )
+from collections import OrderedDict
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from files import write_json
 from pathlib import Path
 
 from agreements import get_agreements
+from bundles import export_bundles
+from checkpoint import DEFAULT_CHECKPOINT_EVERY, Checkpoint, load_checkpoint
 from institutions import get_institutions
+from jsonstream import iter_text_array
+from manifest import (
+    DEFAULT_MAX_AGE_DAYS,
+    hash_agreement,
+    get_university_method,
+    is_fresh,
+    is_known_empty,
+    load_manifest,
+    make_entry,
+    manifest_key,
+    save_manifest
+)
+from reverse_index import build_reverse_index
+from search_index import build_search_index, index_rows
+
+DEFAULT_WORKERS = 4
+
+# Usually, if the departmental agreements are available, the prefix agreements ("AllPrefixes") will be too.
+# So if there is no departmental agreement, we can save a request and skip to the GE requirements.
+AGREEMENT_METHODS = {
+    "AllMajors": "All majors",
+    "AllDepartments": "All departments",
+    "AllGeneralEducation": "All general education requirements",
+}
 
 
 def json_if_str(x):
@@ -156,33 +192,52 @@ def build_articulation_tree(sending_articulation: dict | None) -> dict | None:
     return normalize_node(node).to_dict()
 
 
-def request_all_courses(year: int, sending: int, receiving: int, method: str) -> dict:
+# Returns the decoded agreement and the hash of the response body it came from.
+def request_all_courses(year: int, sending: int, receiving: int, method: str) -> tuple[dict, str]:
     url = f"https://www.assist.org/api/articulation/Agreements?Key={year}/{sending}/to/{receiving}/{method}"
 
-    all_courses_json: dict = request.get(url=url).json()
+    response = request.get(url=url)
+    with instrumentation.stage("decode"):
+        all_courses_json: dict = json.loads(response.content)
+
     if not all_courses_json["isSuccessful"]:
         raise FileNotFoundError("Agreement was not found for this combination.")
 
-    return all_courses_json
+    with instrumentation.stage("hash"):
+        content_hash = hash_agreement(response.content)
 
+    return all_courses_json, content_hash
 
-def get_all_courses_json(agreement_year: int, sending_id: int, receiving_id: int) -> dict | None:
-    try:
-        return request_all_courses(agreement_year, sending_id, receiving_id, "AllMajors")
-    except FileNotFoundError:
-        print("All majors agreement was not found. Attempting all departments.")
 
-    try:
-        return request_all_courses(agreement_year, sending_id, receiving_id, "AllDepartments")
-    except FileNotFoundError:
-        print("All departments agreement was not found. Attempting all general education requirements.")
+def get_all_courses_json(
+    agreement_year: int,
+    sending_id: int,
+    receiving_id: int,
+    preferred: str | None = None
+) -> tuple[str, dict, str] | None:
+    methods = list(AGREEMENT_METHODS)
 
-    # Usually, if the departmental agreements are available, the prefix agreements ("AllPrefixes") will be too.
-    # So if there is no departmental agreement, we can save a request and skip to the GE requirements.
-    try:
-        return request_all_courses(agreement_year, sending_id, receiving_id, "AllGeneralEducation")
-    except FileNotFoundError:
-        print("All general education requirements agreement was not found.")
+    # Whatever worked last time almost always works again, so it's worth trying before the usual order.
+    if preferred in methods:
+        methods.remove(preferred)
+        methods.insert(0, preferred)
+
+    # Offline, a method that isn't cached says nothing about whether ASSIST has it. If no cached method works either,
+    # the agreement is reported as missing from the cache rather than as having no viable agreements.
+    cache_miss = None
+
+    for method in methods:
+        instrumentation.count("methods_tried")
+        try:
+            return method, *request_all_courses(agreement_year, sending_id, receiving_id, method)
+        except FileNotFoundError:
+            print(f"{AGREEMENT_METHODS[method]} agreement was not found.")
+        except request.CacheMiss as e:
+            print(f"{AGREEMENT_METHODS[method]} agreement is not in the response cache.")
+            cache_miss = e
+
+    if cache_miss is not None:
+        raise cache_miss
 
     return None
 
@@ -196,81 +251,92 @@ def articulation_to_json_dict(articulation: dict) -> dict | None:
     return build_articulation_tree(sending)
 
 
-def extract_articulation_rows(result: dict) -> list[dict]:
-    articulations = json_if_str(result.get("articulations", [])) or []
+# ASSIST sends articulations and templateAssets as JSON strings inside the response. Decoding them one element at a time
+# means only that element is ever held as Python objects, rather than the whole list next to the string it came from.
+def iter_embedded_array(value) -> Iterator:
+    if isinstance(value, str) and value.lstrip().startswith("["):
+        return iter_text_array(value)
 
-    if len(articulations) == 0:
-        return articulations
+    value = json_if_str(value)
+    if isinstance(value, list):
+        return iter(value)
 
-    # All Majors / All General Education
-    if isinstance(articulations[0], dict) and "articulations" not in articulations[0]:
-        return articulations
+    return iter([] if value is None else [value])
 
-    # All Departments or All Prefixes
-    flat = []
-    for subject in articulations:
-        for row in (subject.get("articulations") or []):
-            flat.append({"articulation": row})
 
-    return flat
+def iter_articulation_rows(result: dict) -> Iterator[dict]:
+    for element in iter_embedded_array(result.get("articulations", [])):
+        # All Departments or All Prefixes group their rows by subject. All Majors / All General Education don't.
+        if isinstance(element, dict) and "articulations" in element:
+            for row in element.get("articulations") or []:
+                yield {"articulation": row}
+        else:
+            yield element
 
 
-def walk_template_assets(assets) -> list[tuple[str | None, ReceivingItem]]:
-    assets = json_if_str(assets)
-    out: list[tuple[str | None, ReceivingItem]] = []
+def is_course_dict(node) -> bool:
+    return isinstance(node, dict) and "prefix" in node and "courseNumber" in node and "courseTitle" in node
 
-    def is_course_dict(d: dict) -> bool:
-        return isinstance(d, dict) and all(k in d for k in ("prefix", "courseNumber", "courseTitle"))
 
-    def dfs(node, cell_id=None):
-        if isinstance(node, dict):
-            cid = node.get("id", cell_id)
+# Template assets describe every cell of an agreement, including the ones without an articulation row, so that's where
+# the rest of the receiving courses, series and requirements come from. Cells that have a row are skipped, and only the
+# first item with each key is kept.
+def extract_template_inventory(template_assets, existing_articulation_cell_ids: set[str]) -> list[ReceivingItem]:
+    out: list[ReceivingItem] = []
+    seen_keys: set[str] = set()
 
-            if is_course_dict(node):
-                basic_course = BasicCourse.from_assist(node)
-                out.append((cid, ReceivingItem.from_receiving(basic_course)))
+    def is_new(key: str) -> bool:
+        if key in seen_keys:
+            return False
 
-            series = node.get("series")
-            if series is not None:
-                courses = [BasicCourse.from_assist(c) for c in series["courses"] if is_course_dict(c)]
+        seen_keys.add(key)
+        return True
 
-                if courses:
-                    conjunction = Conjunction(series.get("conjunction").upper())
-                    rs = ReceivingSeries(key=make_series_key(courses), conjunction=conjunction, courses=courses)
-                    out.append((cid, ReceivingItem.from_receiving(rs)))
+    # Top-level assets are decoded and walked one at a time. An explicit stack (with children pushed in reverse)
+    # visits nodes in the same order as a recursive walk, without the recursion limit. Only dicts and lists are pushed,
+    # since nothing else can hold an asset.
+    for root in iter_embedded_array(template_assets):
+        stack: list[tuple[dict | list, str | None]] = [(root, None)] if isinstance(root, (dict, list)) else []
 
-            req_tuple = ReceivingRequirement.get_kind_and_key(node)
-            if req_tuple is not None:
-                kind, key = req_tuple
-                req = ReceivingRequirement(kind=kind, key=node[key]["name"].strip())
-                out.append((cid, ReceivingItem.from_receiving(req)))
+        while stack:
+            node, cell_id = stack.pop()
 
-            for k, v in node.items():
-                if k != "series":
-                    dfs(v, cid)
-        elif isinstance(node, list):
-            for v in node:
-                dfs(v, cell_id)
+            if isinstance(node, list):
+                stack.extend((child, cell_id) for child in reversed(node) if isinstance(child, (dict, list)))
+                continue
 
-    dfs(assets, None)
+            cid = node.get("id", cell_id)
 
-    return out
+            # Checking the cell and the key first means items that would be thrown away are never built.
+            wanted = not (cid and cid in existing_articulation_cell_ids)
 
+            # Courses are leaves, so there's nothing under them worth walking.
+            if is_course_dict(node):
+                if wanted and is_new(f"{node['prefix'].strip()} {node['courseNumber'].strip()}"):
+                    out.append(ReceivingItem.from_receiving(BasicCourse.from_assist(node)))
+                continue
 
-def extract_template_inventory(template_assets: dict, existing_articulation_cell_ids: set[str]) -> list[ReceivingItem]:
-    items = walk_template_assets(template_assets)
-    out: list[ReceivingItem] = []
-    seen_keys: set[str] = set()
+            series = node.get("series")
+            if wanted and series is not None:
+                courses = [BasicCourse.from_assist(c) for c in series["courses"] if is_course_dict(c)]
+                key = make_series_key(courses)
 
-    for cell_id, item in items:
-        if cell_id and cell_id in existing_articulation_cell_ids:
-            continue  # already has an articulation row
+                if courses and is_new(key):
+                    conjunction = Conjunction(series.get("conjunction").upper())
+                    rs = ReceivingSeries(key=key, conjunction=conjunction, courses=courses)
+                    out.append(ReceivingItem.from_receiving(rs))
 
-        if item.key in seen_keys:
-            continue
+            req_tuple = ReceivingRequirement.get_kind_and_key(node) if wanted else None
+            if req_tuple is not None:
+                kind, field = req_tuple
+                key = node[field]["name"].strip()
+
+                if is_new(key):
+                    out.append(ReceivingItem.from_receiving(ReceivingRequirement(kind=kind, key=key)))
 
-        seen_keys.add(item.key)
-        out.append(item)
+            # Series courses are only part of the series, not items of their own.
+            children = [(child, cid) for k, child in node.items() if k != "series" and isinstance(child, (dict, list))]
+            stack.extend(reversed(children))
 
     return out
 
@@ -347,13 +413,16 @@ def get_req_articulation(art: dict, node_dict: dict, seen: dict[str, int], out:
 
 def get_articulations(all_courses_json: dict) -> list[ReceivingItem]:
     result = all_courses_json["result"]
-    rows = extract_articulation_rows(result)
 
     out: list[ReceivingItem] = []
     seen: dict[str, int] = {}
+    existing_articulation_cell_ids: set[str] = set()
+
+    # Actual articulations. Rows are decoded as they're needed, and only their template cell is kept afterwards.
+    for row in iter_articulation_rows(result):
+        if row.get("templateCellId"):
+            existing_articulation_cell_ids.add(row["templateCellId"])
 
-    # Actual articulations
-    for row in rows:
         articulation = row["articulation"]
         node_dict = articulation_to_json_dict(articulation)
 
@@ -366,7 +435,6 @@ def get_articulations(all_courses_json: dict) -> list[ReceivingItem]:
             get_req_articulation(articulation, node_dict, seen, out)
 
     # Just for templates. They only hold receiving data
-    existing_articulation_cell_ids = {row["templateCellId"] for row in rows if row.get("templateCellId")}
     for inv in extract_template_inventory(result["templateAssets"], existing_articulation_cell_ids):
         if inv.key in seen:
             continue
@@ -376,6 +444,13 @@ def get_articulations(all_courses_json: dict) -> list[ReceivingItem]:
     return out
 
 
+# Runs get_articulations in a parse worker process. The time is returned so it can still be added to the pair's span.
+def parse_in_worker(all_courses_json: dict) -> tuple[list[ReceivingItem], float]:
+    start = time.perf_counter()
+    all_articulations = get_articulations(all_courses_json)
+    return all_articulations, time.perf_counter() - start
+
+
 def parse_num(num: str) -> tuple[int, str]:
     suffix = num.strip().upper()
     i = 0
@@ -449,12 +524,89 @@ def subject_bucket(item: ReceivingItem) -> list[tuple[str, str, str]]:
     return [("UNKNOWN", "UNKNOWN", "UNKNOWN")]
 
 
+class SubjectRows:
+    def __init__(self, rows: list[dict]):
+        self.rows = rows
+        self.index: dict[str, dict] = {}
+        self.art_maps: dict[str, dict[str, dict]] = {}
+
+        for row in rows:
+            row.setdefault("articulations", [])
+            key = row["key"]
+            self.index[key] = row
+            self.art_maps[key] = {art["sending_name"]: art for art in row["articulations"]}
+
+    # Merging colleges only touches index and art_maps. The rows are rebuilt and sorted once, right before writing.
+    def materialize(self) -> list[dict]:
+        for key, row in self.index.items():
+            row["articulations"] = list(self.art_maps[key].values())
+
+        self.rows = sorted(self.index.values(), key=row_sort_key)
+        return self.rows
+
+
+# Holds the courses.json rows of every subject touched while crawling a university. With max_loaded set, only that
+# many subjects stay in memory; the least recently used one is written out when another needs to be loaded, and is
+# read back from disk if a later college touches it again.
+class SubjectStore:
+    def __init__(self, university_name: str, max_loaded: int | None = None):
+        self.university_name = university_name
+        self.max_loaded = max_loaded
+        self.loaded: OrderedDict[str, SubjectRows] = OrderedDict()
+        self.dirty: set[str] = set()
+
+    def courses_path(self, subject_dir: str) -> Path:
+        return Path(f"data/{self.university_name}/{subject_dir}/courses.json")
+
+    def get(self, subject_dir: str) -> SubjectRows:
+        subject = self.loaded.get(subject_dir)
+
+        if subject is not None:
+            self.loaded.move_to_end(subject_dir)
+            return subject
+
+        courses_path = self.courses_path(subject_dir)
+        if courses_path.exists():
+            with open(courses_path, "r") as f:
+                subject = SubjectRows(json.load(f))
+        else:
+            subject = SubjectRows([])
+
+        self.loaded[subject_dir] = subject
+
+        while self.max_loaded is not None and len(self.loaded) > self.max_loaded:
+            self.spill()
+
+        return subject
+
+    def mark_changed(self, subject_dir: str) -> None:
+        self.dirty.add(subject_dir)
+
+    def spill(self) -> None:
+        subject_dir, subject = self.loaded.popitem(last=False)
+
+        if subject_dir in self.dirty:
+            self.write(subject_dir, subject)
+
+    def write(self, subject_dir: str, subject: SubjectRows) -> None:
+        rows = subject.materialize()
+
+        # Subjects are only written when they've changed, so reindexing here keeps the search index in step.
+        if write_json(self.courses_path(subject_dir), rows):
+            index_rows(self.university_name, subject_dir, rows)
+
+        self.dirty.discard(subject_dir)
+
+    def flush(self) -> None:
+        for subject_dir, subject in self.loaded.items():
+            if subject_dir in self.dirty:
+                self.write(subject_dir, subject)
+
+
 def save_articulations(
-    university_name: str,
     college_name: str,
     all_articulations: list[ReceivingItem],
-    rows_by_subject_dir: dict[str, list[dict]],
-    changed_subjects: dict[str, bool],
+    store: SubjectStore,
     subjects_map: dict[str, str],
 ) -> None:
     buckets: dict[str, dict[str, str | list[ReceivingItem]]] = {}
@@ -476,26 +628,9 @@ def save_articulations(
         else:
             subjects_map.setdefault(prefix, prefix)
 
-        rows = rows_by_subject_dir.get(subject_dir)
-        if rows is None:
-            courses_path = Path(f"data/{university_name}/{subject_dir}/courses.json")
-
-            if courses_path.exists():
-                with open(courses_path, "r") as f:
-                    rows = json.load(f)
-            else:
-                rows = []
-
-            rows_by_subject_dir[subject_dir] = rows
-            changed_subjects.setdefault(subject_dir, False)
-
-        index: dict[str, dict] = {}
-        art_maps: dict[str, dict] = {}
-        for row in rows:
-            row.setdefault("articulations", [])
-            key = row["key"]
-            index[key] = row
-            art_maps[key] = {art["sending_name"]: art for art in row["articulations"]}
+        subject_rows = store.get(subject_dir)
+        index = subject_rows.index
+        art_maps = subject_rows.art_maps
 
         changed = False
 
@@ -508,26 +643,12 @@ def save_articulations(
             if upsert_sending_articulation(art_maps[item.key], college_name, item.sending_articulation):
                 changed = True
 
-        if not changed:
-            continue
-
-        for k, amap in art_maps.items():
-            index[k]["articulations"] = list(amap.values())
-        new_rows = list(index.values())
-        new_rows.sort(key=row_sort_key)
+        if changed:
+            store.mark_changed(subject_dir)
 
-        rows_by_subject_dir[subject_dir] = new_rows
-        changed_subjects[subject_dir] = True
 
-
-def flush_courses_for_university(name: str, rows: dict[str, list[dict]], subjects: dict[str, bool], ) -> None:
-    for subject_dir, rows in rows.items():
-        if not subjects.get(subject_dir):
-            continue
-        courses_path = Path(f"data/{name}/{subject_dir}/courses.json")
-        courses_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(courses_path, "w") as f:
-            json.dump(rows, f, indent=4)
+def flush_courses_for_university(store: SubjectStore) -> None:
+    store.flush()
 
 
 def flush_subjects_for_university(name: str, subjects_map: dict[str, str]) -> None:
@@ -553,91 +674,387 @@ def flush_subjects_for_university(name: str, subjects_map: dict[str, str]) -> No
 
     new_payload = [{"prefix": p, "name": merged[p]} for p in sorted(merged.keys())]
     if new_payload != (existing or []):
-        subjects_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(subjects_path, "w") as out:
-            json.dump(new_payload, out, indent=4)
+        write_json(subjects_path, new_payload)
+
+
+@dataclass
+class CrawlResults:
+    successful: int = 0
+    no_agreements: int = 0
+    no_modern_agreements: int = 0
+    no_viable_agreements: int = 0
+    unchanged_agreements: int = 0
+    not_cached: int = 0
+
+    def add(self, other: "CrawlResults") -> None:
+        self.successful += other.successful
+        self.no_agreements += other.no_agreements
+        self.no_modern_agreements += other.no_modern_agreements
+        self.no_viable_agreements += other.no_viable_agreements
+        self.unchanged_agreements += other.unchanged_agreements
+        self.not_cached += other.not_cached
+
+    def print(self, title: str) -> None:
+        print(f"== {title} ==")
+        print(f"Agreements saved: {self.successful}")
+        print(f"Missing agreements: {self.no_agreements}")
+        print(f"Lacking modern agreements: {self.no_modern_agreements}")
+        print(f"No viable modern agreements: {self.no_viable_agreements}")
+        print(f"Unchanged agreements: {self.unchanged_agreements}")
+
+        if self.not_cached:
+            print(f"Not in the response cache: {self.not_cached}")
+
+
+@dataclass
+class CrawlOptions:
+    incremental: bool = False
+    max_age_days: float = DEFAULT_MAX_AGE_DAYS
+    max_loaded_subjects: int | None = None
+    checkpoint_every: int = DEFAULT_CHECKPOINT_EVERY
+    parse_workers: int = 0
+
+
+def crawl_university(
+    university: Institution,
+    colleges: list[Institution],
+    manifest: dict[str, dict],
+    manifest_lock: threading.Lock,
+    pool: ThreadPoolExecutor,
+    parse_pool: ProcessPoolExecutor | None,
+    checkpoint: Checkpoint,
+    options: CrawlOptions
+) -> CrawlResults:
+    print(f"Getting articulations for {university.name} (ID {university.id}).")
+
+    results = CrawlResults()
+    all_agreements = get_agreements(university.id)
+
+    store = SubjectStore(university.name, options.max_loaded_subjects)
+    subjects_map: dict[str, str] = {}
+
+    # Other universities save the shared manifest whenever they checkpoint, so this university's entries are only
+    # added to it once the data they describe has been written.
+    manifest_entries: dict[str, dict] = {}
+
+    def save_progress() -> None:
+        with instrumentation.recorder.record("checkpoint", university=university.name) as span:
+            with span.stage("courses"):
+                flush_courses_for_university(store)
+            with span.stage("subjects"):
+                flush_subjects_for_university(university.name, subjects_map)
+
+            with manifest_lock, span.stage("manifest"):
+                manifest.update(manifest_entries)
+                manifest_entries.clear()
+                save_manifest(manifest)
+
+    with manifest_lock:
+        university_method = get_university_method(manifest, university.id)
+
+    pending: list[tuple[Institution, int, str | None]] = []
+    for college in colleges:
+        if checkpoint.is_completed(university.id, college.id):
+            print(f"{college.name} and {university.name} were already saved before the checkpoint.")
+            continue
 
+        agreement_year = all_agreements.get(college.id, -1)
 
-def run(desired_universities: list[str] = None) -> None:
-    if desired_universities is None or len(desired_universities) == 0:
-        desired_universities = ["CSU", "UC", "AICCU"]
+        if agreement_year == -1:
+            print(f"{college.name} and {university.name} have no agreements.")
+            results.no_agreements += 1
+            continue
 
-    institutions: list[Institution] = get_institutions(create_new_if_existing=True)
+        # Modern agreements only started in year ID 74
+        if agreement_year < 74:
+            print(f"{college.name} and {university.name} have no modern agreements.")
+            results.no_modern_agreements += 1
+            continue
 
-    colleges = sorted([i for i in institutions if i.category == "CCC"], key=lambda i: i.name)
-    universities = [i for i in institutions if i.category in desired_universities]
+        entry = manifest.get(manifest_key(college.id, university.id))
 
-    successful = 0
-    no_agreements = 0
-    no_modern_agreements = 0
-    no_viable_agreements = 0
+        if is_known_empty(entry, agreement_year, options.max_age_days):
+            print(f"{college.name} and {university.name} had no viable agreements last run.")
+            results.no_viable_agreements += 1
+            continue
 
-    for university in universities:
-        print(f"Getting articulations for {university.name} (ID {university.id}).")
+        if options.incremental and is_fresh(entry, agreement_year, options.max_age_days):
+            print(f"{college.name} and {university.name} are unchanged since the last run.")
+            results.unchanged_agreements += 1
+            continue
 
-        all_agreements = get_agreements(university.id)
+        preferred = entry.get("method") if entry is not None else None
+        pending.append((college, agreement_year, preferred or university_method))
+
+    def is_unchanged_agreement(college: Institution, content_hash: str) -> bool:
+        if not options.incremental:
+            return False
+
+        with manifest_lock:
+            previous = manifest.get(manifest_key(college.id, university.id))
+
+        return previous is not None and previous.get("content_hash") == content_hash
+
+    # Offline replays didn't fetch anything, so entries keep the time the agreement was really fetched (if it's known).
+    def make_manifest_entry(college: Institution, agreement_year: int, method: str | None, content_hash: str | None) -> dict:
+        entry = make_entry(college.id, university.id, agreement_year, method, content_hash)
+
+        if request.cache.offline:
+            with manifest_lock:
+                previous = manifest.get(manifest_key(college.id, university.id))
+            entry["fetched_at"] = previous.get("fetched_at") if previous is not None else None
+
+        return entry
+
+    # The pair's span follows it from the fetch in the agreement pool to the merge below, and is emitted once merged.
+    # With parse workers, the agreement is handed to one as soon as it's downloaded (unless it's going to be skipped as
+    # unchanged), so parsing overlaps with the next requests instead of waiting for its turn to be merged. A cache miss
+    # is handed to the merge loop as is.
+    def fetch(
+        job: tuple[Institution, int, str | None]
+    ) -> tuple[instrumentation.Span, tuple[str, dict, str, Future | None] | request.CacheMiss | None]:
+        college, agreement_year, preferred = job
+        print(f"Getting articulation: {college.name} (ID {college.id}) -> {university.name} "
+              f"(ID {university.id}) for year ID {agreement_year}")
+
+        span = instrumentation.Span("pair", university=university.name, college=college.name, year=agreement_year)
+        with instrumentation.activate(span):
+            try:
+                with span.stage("fetch"):
+                    fetched = get_all_courses_json(agreement_year, college.id, university.id, preferred)
+            except request.CacheMiss as e:
+                return span, e
+
+            if fetched is None:
+                return span, None
+
+            method, all_courses, content_hash = fetched
+
+        parsed = None
+        if parse_pool is not None and not is_unchanged_agreement(college, content_hash):
+            parsed = parse_pool.submit(parse_in_worker, all_courses)
+
+        return span, (method, all_courses, content_hash, parsed)
+
+    uncheckpointed: list[int] = []
+
+    # map() yields in submission order, so colleges are still merged in the same order as a serial run.
+    # The merge order doesn't depend on which parse worker finishes first, so the output is the same as parsing inline.
+    for (college, agreement_year, _), (span, fetched) in zip(pending, pool.map(fetch, pending)):
+        if len(uncheckpointed) >= options.checkpoint_every:
+            save_progress()
+            checkpoint.complete(university.id, uncheckpointed)
+            uncheckpointed.clear()
+
+        uncheckpointed.append(college.id)
+        key = manifest_key(college.id, university.id)
+
+        with instrumentation.recorder.resume(span):
+            # Nothing is known about the agreement, so the manifest is left as it was.
+            if isinstance(fetched, request.CacheMiss):
+                print(f"{college.name} and {university.name} are not in the response cache.")
+                results.not_cached += 1
+                span.fields["outcome"] = "not_cached"
+                continue
 
-        rows_by_subject_dir: dict[str, list[dict]] = {}
-        changed_subjects: dict[str, bool] = {}
-        subjects_map: dict[str, str] = {}
+            if fetched is None:
+                print(f"{college.name} and {university.name} have no viable agreements.")
+                manifest_entries[key] = make_manifest_entry(college, agreement_year, None, None)
+                results.no_viable_agreements += 1
+                span.fields["outcome"] = "no_viable_agreements"
+                continue
 
-        for college in colleges:
-            agreement_year = all_agreements.get(college.id, -1)
+            method, all_courses, content_hash, parsed = fetched
+            span.fields["method"] = method
 
-            if agreement_year == -1:
-                print(f"{college.name} and {university.name} have no agreements.")
-                no_agreements += 1
-                continue
+            entry = make_manifest_entry(college, agreement_year, method, content_hash)
 
-            # Modern agreements only started in year ID 74
-            if agreement_year < 74:
-                print(f"{college.name} and {university.name} have no modern agreements.")
-                no_modern_agreements += 1
+            if is_unchanged_agreement(college, content_hash):
+                print(f"{college.name} and {university.name} are unchanged since the last run.")
+                manifest_entries[key] = entry
+                results.unchanged_agreements += 1
+                span.fields["outcome"] = "unchanged"
                 continue
 
-            print(f"Getting articulation: {college.name} (ID {college.id}) -> {university.name} (ID {university.id}) "
-                  f"for year ID {agreement_year}")
+            # In the parse workers' case, this is only the time spent waiting for the result.
+            with span.stage("parse"):
+                if parsed is None:
+                    all_articulations = get_articulations(all_courses)
+                else:
+                    all_articulations, worker_seconds = parsed.result()
+                    span.add_time("parse_worker", worker_seconds)
 
-            all_courses = get_all_courses_json(agreement_year, college.id, university.id)
+            with span.stage("merge"):
+                save_articulations(college.name, all_articulations, store, subjects_map)
 
-            if all_courses is None:
-                print(f"{college.name} and {university.name} have no viable agreements.")
-                no_viable_agreements += 1
-                continue
+            manifest_entries[key] = entry
+
+            results.successful += 1
+            span.fields["outcome"] = "saved"
+
+    save_progress()
+    checkpoint.finish(university.id)
+
+    results.print(university.name)
+    print("\n")
+
+    return results
+
+
+def run(
+    desired_universities: list[str] = None,
+    workers: int = DEFAULT_WORKERS,
+    university_workers: int = 1,
+    options: CrawlOptions | None = None,
+    resume: bool = False
+) -> None:
+    if desired_universities is None or len(desired_universities) == 0:
+        desired_universities = ["CSU", "UC", "AICCU"]
+
+    if options is None:
+        options = CrawlOptions()
+
+    if resume:
+        checkpoint = load_checkpoint(desired_universities)
+        desired_universities = checkpoint.desired_universities
+    else:
+        checkpoint = Checkpoint(desired_universities, {}, [])
 
-            all_articulations = get_articulations(all_courses)
+    request.load_rate_limit()
+    institutions: list[Institution] = get_institutions(create_new_if_existing=True)
+
+    colleges = sorted([i for i in institutions if i.category == "CCC"], key=lambda i: i.name)
+    universities = [i for i in institutions if i.category in desired_universities]
 
-            save_articulations(
-                university.name,
-                college.name,
-                all_articulations,
-                rows_by_subject_dir,
-                changed_subjects,
-                subjects_map
+    for university in universities:
+        if checkpoint.is_finished(university.id):
+            print(f"{university.name} was already finished before the checkpoint.")
+
+    universities = [u for u in universities if not checkpoint.is_finished(u.id)]
+
+    results = CrawlResults()
+    manifest = load_manifest()
+    manifest_lock = threading.Lock()
+
+    # Parse workers are spawned rather than forked, since forking a process that's already running threads isn't safe.
+    parse_pool = None
+    if options.parse_workers > 0:
+        parse_pool = ProcessPoolExecutor(options.parse_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    # Universities only write to their own directories, so several can be crawled at once. They all share the
+    # agreement pool and the rate limiter in request, so adding university workers doesn't add requests per minute.
+    with (
+        ThreadPoolExecutor(max_workers=workers) as pool,
+        ThreadPoolExecutor(max_workers=university_workers) as university_pool
+    ):
+        futures = [
+            university_pool.submit(
+                crawl_university,
+                university,
+                colleges,
+                manifest,
+                manifest_lock,
+                pool,
+                parse_pool,
+                checkpoint,
+                options
             )
+            for university in universities
+        ]
+
+        for future in futures:
+            results.add(future.result())
+
+    if parse_pool is not None:
+        parse_pool.shutdown()
 
-            successful += 1
+    checkpoint.clear()
 
-        flush_courses_for_university(university.name, rows_by_subject_dir, changed_subjects)
-        flush_subjects_for_university(university.name, subjects_map)
+    with instrumentation.recorder.record("finish") as span:
+        with span.stage("reverse_index"):
+            build_reverse_index()
+        with span.stage("search_index"):
+            build_search_index()
+        with span.stage("bundles"):
+            export_bundles()
 
-        print("\n")
+        if request.cache.enabled:
+            with span.stage("cache_evict"):
+                request.cache.evict()
 
-    print("== Results ==")
-    print(f"Agreements saved: {successful}")
-    print(f"Missing agreements: {no_agreements}")
-    print(f"Lacking modern agreements: {no_modern_agreements}")
-    print(f"No viable modern agreements: {no_viable_agreements}")
+    request.save_rate_limit()
+
+    results.print("Results")
+    request.print_stats()
+    print()
+    instrumentation.recorder.print_summary()
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive number.")
+
+    return number
 
 
 def main():
-    desired_universities = [u.upper() for u in sys.argv[1:]]
+    parser = argparse.ArgumentParser(description="Fetch articulation data from ASSIST.")
+    parser.add_argument("universities", nargs="*", type=str.upper, choices=["CSU", "UC", "AICCU"],
+                        help="university types to fetch (defaults to all three)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="number of agreements to request concurrently")
+    parser.add_argument("--university-workers", type=int, default=1,
+                        help="number of universities to process concurrently")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only fetch agreements whose year changed or that are older than --max-age")
+    parser.add_argument("--max-age", type=float, default=DEFAULT_MAX_AGE_DAYS,
+                        help="days before an unchanged agreement is fetched again in incremental mode")
+    parser.add_argument("--max-subjects", type=positive_int,
+                        help="keep at most this many subjects of a university in memory, writing out the rest")
+    parser.add_argument("--checkpoint-every", type=positive_int, default=DEFAULT_CHECKPOINT_EVERY,
+                        help="save progress after this many colleges so an interrupted run can be resumed")
+    parser.add_argument("--parse-workers", type=int, default=0,
+                        help="parse agreements in this many processes while the next ones are requested "
+                             "(0 parses them inline)")
+    parser.add_argument("--resume", action="store_true", help="continue the last run from its checkpoint")
+    parser.add_argument("--compact", action="store_true", help="write data files without indentation")
+    parser.add_argument("--offline", action="store_true",
+                        help="rebuild the data folder from cached ASSIST responses without making any requests")
+    parser.add_argument("--timeout", type=float, default=request.TIMEOUT[1],
+                        help="seconds to wait for ASSIST to respond before retrying")
+    parser.add_argument("--no-cache", action="store_true", help="don't read or write the response cache")
+    parser.add_argument("--trace", nargs="?", const=str(instrumentation.TRACE_PATH), metavar="PATH",
+                        help="write the timings and request stats of every agreement as JSON lines")
+    args = parser.parse_args()
+
+    if args.offline and args.no_cache:
+        parser.error("--offline needs the response cache.")
+
+    files.indent = None if args.compact else 4
+    request.timeout = (request.TIMEOUT[0], args.timeout)
+    request.cache.offline = args.offline
+    request.cache.enabled = not args.no_cache
+
+    if args.trace:
+        instrumentation.recorder.open(Path(args.trace))
 
-    if len(desired_universities) > 3:
-        print("Invalid number of universities provided.")
-        print("Choose from CSU, UC, and AICCU.")
-    else:
-        run(desired_universities)
+    try:
+        run(
+            args.universities,
+            workers=args.workers,
+            university_workers=args.university_workers,
+            options=CrawlOptions(
+                incremental=args.incremental,
+                max_age_days=args.max_age,
+                max_loaded_subjects=args.max_subjects,
+                checkpoint_every=args.checkpoint_every,
+                parse_workers=args.parse_workers
+            ),
+            resume=args.resume
+        )
+    finally:
+        instrumentation.recorder.close()
 
 
 if __name__ == "__main__":
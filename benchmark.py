@@ -0,0 +1,477 @@
+import argparse
+import articulations
+import contextlib
+import json
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from pathlib import Path
+
+from articulations import (
+    SubjectStore,
+    extract_template_inventory,
+    get_articulations,
+    iter_articulation_rows,
+    json_if_str,
+    make_series_key,
+    row_sort_key,
+    save_articulations,
+    subject_bucket,
+    upsert_sending_articulation
+)
+from classes import (
+    BasicCourse,
+    Conjunction,
+    ReceivingItem,
+    ReceivingRequirement,
+    ReceivingSeries,
+    ReceivingType,
+    SendingCourse,
+    articulation_from_dict
+)
+from collections import defaultdict
+from fixtures import PROFILES, recorded_agreements, synthetic_agreement
+from reverse_index import get_university_names
+
+
+def receiving_from_row(row: dict) -> BasicCourse | ReceivingSeries | ReceivingRequirement:
+    if row["type"] == ReceivingType.COURSE.value:
+        return BasicCourse.from_dict(row)
+
+    if row["type"] == ReceivingType.SERIES.value:
+        courses = [BasicCourse.from_dict(course) for course in row["courses"]]
+        return ReceivingSeries(key=row["key"], conjunction=Conjunction(row["conjunction"]), courses=courses)
+
+    return ReceivingRequirement(kind=ReceivingType(row["type"]), key=row["key"])
+
+
+# Turns a saved courses.json back into what get_articulations would have returned for each college, in the order
+# run() merges them. Rows without any articulations can't be attributed to a college, so they're left out.
+def items_by_college(university_name: str, subject_prefix: str) -> dict[str, list[ReceivingItem]]:
+    with open(Path(f"data/{university_name}/{subject_prefix}/courses.json"), "r") as f:
+        rows: list[dict] = json.load(f)
+
+    colleges: dict[str, list[ReceivingItem]] = {}
+    for row in rows:
+        receiving = receiving_from_row(row)
+
+        for articulation in row["articulations"]:
+            item = ReceivingItem.from_receiving(receiving, articulation["sending_articulation"])
+            colleges.setdefault(articulation["sending_name"], []).append(item)
+
+    return dict(sorted(colleges.items()))
+
+
+# save_articulations reads and writes relative to the working directory, so benchmarks that call it run in a temporary
+# one and the real data folder is never touched.
+@contextlib.contextmanager
+def scratch_directory():
+    with tempfile.TemporaryDirectory() as tmp, contextlib.chdir(tmp):
+        yield
+
+
+# The original save_articulations, kept to check the current one against and to time it. Every college that changes a
+# subject rebuilds all of its rows' articulation lists and sorts the rows again.
+def reference_save_articulations(
+    college_name: str,
+    all_articulations: list[ReceivingItem],
+    store: SubjectStore,
+    subjects_map: dict[str, str],
+) -> None:
+    buckets: dict[str, dict[str, str | list[ReceivingItem]]] = {}
+    for item in all_articulations:
+        for directory, prefix, name in subject_bucket(item):
+            if directory == "UNKNOWN":
+                continue
+
+            b = buckets.setdefault(directory, {"prefix": prefix, "name": name, "items": []})
+            b["items"].append(item)
+
+    for subject_dir, meta in buckets.items():
+        prefix: str = meta["prefix"]
+        subject: str = meta["name"]
+        items: list[ReceivingItem] = meta["items"]
+
+        if subject:
+            subjects_map[prefix] = subject
+        else:
+            subjects_map.setdefault(prefix, prefix)
+
+        subject_rows = store.get(subject_dir)
+        index = subject_rows.index
+        art_maps = subject_rows.art_maps
+
+        changed = False
+
+        for item in items:
+            if item.key not in index:
+                index[item.key] = {"type": item.receiving_type.value, **item.receiving.to_dict(), "articulations": []}
+                art_maps[item.key] = {}
+                changed = True
+
+            if upsert_sending_articulation(art_maps[item.key], college_name, item.sending_articulation):
+                changed = True
+
+        if not changed:
+            continue
+
+        for k, amap in art_maps.items():
+            index[k]["articulations"] = list(amap.values())
+        new_rows = list(index.values())
+        new_rows.sort(key=row_sort_key)
+
+        subject_rows.rows = new_rows
+        store.mark_changed(subject_dir)
+
+
+# Merges every college with the original save_articulations and with the current one (plus the materialize it defers
+# to write time), checks that both end up with the same rows, then times both.
+def bench_merge(university_name: str, subject_prefix: str, repeat: int) -> bool:
+    colleges = items_by_college(university_name, subject_prefix)
+
+    def merge_reference() -> list[dict]:
+        store = SubjectStore(university_name)
+        subjects_map: dict[str, str] = {}
+        for college_name, items in colleges.items():
+            reference_save_articulations(college_name, items, store, subjects_map)
+
+        return store.get(subject_prefix).rows
+
+    def merge() -> SubjectStore:
+        store = SubjectStore(university_name)
+        subjects_map: dict[str, str] = {}
+        for college_name, items in colleges.items():
+            save_articulations(college_name, items, store, subjects_map)
+
+        return store
+
+    with scratch_directory():
+        expected = merge_reference()
+        rows = merge().get(subject_prefix).materialize()
+
+        if rows != expected:
+            print(f"Merging {university_name} {subject_prefix} doesn't produce the same rows as the original merge.")
+            return False
+
+        reference_time = best_time(merge_reference, repeat)
+        merge_time = best_time(merge, repeat)
+        stores = [merge() for _ in range(repeat)]
+        materialize_time = min(best_time(store.get(subject_prefix).materialize, 1) for store in stores)
+
+    print(f"Merged {len(colleges)} colleges into {len(rows)} rows of {university_name} {subject_prefix} (best of "
+          f"{repeat}).")
+    print(f"Original merge: {reference_time * 1000:.1f} ms")
+    print(f"Merge: {merge_time * 1000:.1f} ms, then materialize: {materialize_time * 1000:.1f} ms "
+          f"({reference_time / max(merge_time + materialize_time, 1e-9):.1f}x faster)")
+
+    return True
+
+
+def read_json(path: Path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def courses_paths(university_names: list[str]) -> list[Path]:
+    paths: list[Path] = []
+    for university_name in university_names:
+        paths.extend(sorted(Path(f"data/{university_name}").glob("*/courses.json")))
+
+    return paths
+
+
+# Compares holding every articulation as parsed JSON against holding it as classes, where identical sending courses
+# are shared. Only what's still allocated once everything is loaded counts.
+def bench_memory(university_names: list[str]) -> None:
+    paths = courses_paths(university_names)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    loaded = [read_json(path) for path in paths]
+    dict_time = time.perf_counter() - start
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    del loaded
+    tracemalloc.stop()
+
+    courses: dict[SendingCourse, SendingCourse] = {}
+    tracemalloc.start()
+    start = time.perf_counter()
+    loaded = []
+    for path in paths:
+        rows: list[dict] = read_json(path)
+        loaded.append([
+            (receiving_from_row(row), [
+                (sys.intern(articulation["sending_name"]), articulation_from_dict(articulation["sending_articulation"], courses))
+                for articulation in row["articulations"]
+            ])
+            for row in rows
+        ])
+        del rows
+    class_time = time.perf_counter() - start
+    class_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"Loaded {len(paths)} subjects from {len(university_names)} universities.")
+    print(f"Dicts: {dict_bytes / 2 ** 20:.1f} MB in {dict_time:.1f} s")
+    print(f"Classes: {class_bytes / 2 ** 20:.1f} MB in {class_time:.1f} s ({len(courses)} distinct sending courses)")
+
+
+# Stages of get_articulations, indented under the stage that calls them. Times are inclusive.
+PIPELINE_STAGES = [
+    ("build_articulation_tree", 1),
+    ("parse_course_group", 2),
+    ("combine_groups", 2),
+    ("normalize_node", 2),
+    ("extract_template_inventory", 1),
+]
+
+
+# Swaps the stage functions in the articulations module for wrappers that add up their time and the memory still
+# allocated when they return. Recursive calls are only counted at the outermost level.
+@contextlib.contextmanager
+def instrumented_stages(times: dict[str, float], retained: dict[str, int]):
+    originals = {name: getattr(articulations, name) for name, _ in PIPELINE_STAGES}
+    depth: dict[str, int] = defaultdict(int)
+
+    def wrap(name: str, function):
+        def wrapper(*args, **kwargs):
+            depth[name] += 1
+            if depth[name] > 1:
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    depth[name] -= 1
+
+            memory = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                times[name] += time.perf_counter() - start
+                retained[name] += tracemalloc.get_traced_memory()[0] - memory
+                depth[name] -= 1
+
+        return wrapper
+
+    for name, function in originals.items():
+        setattr(articulations, name, wrap(name, function))
+
+    try:
+        yield
+    finally:
+        for name, function in originals.items():
+            setattr(articulations, name, function)
+
+
+def run_pipeline(payloads: list[dict]) -> tuple[dict[str, float], dict[str, int]]:
+    times: dict[str, float] = defaultdict(float)
+    retained: dict[str, int] = defaultdict(int)
+
+    memory = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    with instrumented_stages(times, retained):
+        colleges = [get_articulations(payload) for payload in payloads]
+    times["get_articulations"] = time.perf_counter() - start
+    retained["get_articulations"] = tracemalloc.get_traced_memory()[0] - memory
+
+    with scratch_directory():
+        store = SubjectStore("Benchmark University")
+        subjects_map: dict[str, str] = {}
+
+        memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        for i, items in enumerate(colleges):
+            save_articulations(f"College {i:03d}", items, store, subjects_map)
+        times["save_articulations"] = time.perf_counter() - start
+        retained["save_articulations"] = tracemalloc.get_traced_memory()[0] - memory
+
+        memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        subjects = [subject.materialize() for subject in store.loaded.values()]
+        times["materialize"] = time.perf_counter() - start
+        retained["materialize"] = tracemalloc.get_traced_memory()[0] - memory
+
+    del colleges, subjects
+    return times, retained
+
+
+def bench_pipeline(payload_sets: dict[str, list[dict]], repeat: int) -> None:
+    for name, payloads in payload_sets.items():
+        if not payloads:
+            print(f"{name}: no payloads")
+            continue
+
+        size = sum(len(json.dumps(payload)) for payload in payloads)
+        print(f"{name}: {len(payloads)} agreements, {size / 2 ** 20:.1f} MB")
+
+        # Timing runs are done without tracemalloc, which slows allocation-heavy code down several times over.
+        runs = [run_pipeline(payloads)[0] for _ in range(repeat)]
+
+        tracemalloc.start()
+        _, retained = run_pipeline(payloads)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        rows = [("get_articulations", 0), *PIPELINE_STAGES, ("save_articulations", 0), ("materialize", 0)]
+        print(f"  {'stage':<30}{'best ms':>10}{'mean ms':>10}{'retained MB':>14}")
+        for stage, level in rows:
+            samples = [run[stage] * 1000 for run in runs]
+            label = "  " * level + stage
+            print(f"  {label:<30}{min(samples):>10.1f}{statistics.mean(samples):>10.1f}"
+                  f"{retained[stage] / 2 ** 20:>14.2f}")
+
+        print(f"  Peak traced memory: {peak / 2 ** 20:.1f} MB\n")
+
+
+# The original recursive template walk, kept to check extract_template_inventory against and to time it.
+def reference_template_inventory(template_assets, existing_articulation_cell_ids: set[str]) -> list[ReceivingItem]:
+    assets = json_if_str(template_assets)
+    items: list[tuple[str | None, ReceivingItem]] = []
+
+    def is_course_dict(d: dict) -> bool:
+        return isinstance(d, dict) and all(k in d for k in ("prefix", "courseNumber", "courseTitle"))
+
+    def dfs(node, cell_id=None):
+        if isinstance(node, dict):
+            cid = node.get("id", cell_id)
+
+            if is_course_dict(node):
+                basic_course = BasicCourse.from_assist(node)
+                items.append((cid, ReceivingItem.from_receiving(basic_course)))
+
+            series = node.get("series")
+            if series is not None:
+                courses = [BasicCourse.from_assist(c) for c in series["courses"] if is_course_dict(c)]
+
+                if courses:
+                    conjunction = Conjunction(series.get("conjunction").upper())
+                    rs = ReceivingSeries(key=make_series_key(courses), conjunction=conjunction, courses=courses)
+                    items.append((cid, ReceivingItem.from_receiving(rs)))
+
+            req_tuple = ReceivingRequirement.get_kind_and_key(node)
+            if req_tuple is not None:
+                kind, key = req_tuple
+                req = ReceivingRequirement(kind=kind, key=node[key]["name"].strip())
+                items.append((cid, ReceivingItem.from_receiving(req)))
+
+            for k, v in node.items():
+                if k != "series":
+                    dfs(v, cid)
+        elif isinstance(node, list):
+            for v in node:
+                dfs(v, cell_id)
+
+    dfs(assets, None)
+
+    out: list[ReceivingItem] = []
+    seen_keys: set[str] = set()
+
+    for cell_id, item in items:
+        if cell_id and cell_id in existing_articulation_cell_ids:
+            continue
+
+        if item.key in seen_keys:
+            continue
+
+        seen_keys.add(item.key)
+        out.append(item)
+
+    return out
+
+
+def best_time(function, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+# Checks that extract_template_inventory finds exactly what the recursive walk did on every payload, then times both.
+def bench_templates(payload_sets: dict[str, list[dict]], repeat: int) -> bool:
+    all_match = True
+    print(f"{'payloads':<18}{'agreements':>12}{'items':>10}{'recursive ms':>14}{'iterative ms':>14}{'speedup':>10}")
+
+    for name, payloads in payload_sets.items():
+        # Both walks get the same decoded assets, so only the walks themselves are timed.
+        inputs = []
+        for payload in payloads:
+            result = payload["result"]
+            rows = iter_articulation_rows(result)
+            cell_ids = {row["templateCellId"] for row in rows if row.get("templateCellId")}
+            inputs.append((json_if_str(result["templateAssets"]), cell_ids))
+
+        expected = [reference_template_inventory(assets, cell_ids) for assets, cell_ids in inputs]
+        actual = [extract_template_inventory(assets, cell_ids) for assets, cell_ids in inputs]
+        mismatches = sum(e != a for e, a in zip(expected, actual))
+
+        if mismatches:
+            all_match = False
+            print(f"{name}: {mismatches} of {len(inputs)} agreements differ from the recursive walk")
+            continue
+
+        recursive = best_time(lambda: [reference_template_inventory(*i) for i in inputs], repeat)
+        iterative = best_time(lambda: [extract_template_inventory(*i) for i in inputs], repeat)
+        items = sum(len(e) for e in expected)
+        print(f"{name:<18}{len(inputs):>12}{items:>10}{recursive * 1000:>14.1f}{iterative * 1000:>14.1f}"
+              f"{recursive / max(iterative, 1e-9):>9.1f}x")
+
+    return all_match
+
+
+def payload_sets_from_args(args) -> dict[str, list[dict]]:
+    payload_sets = {
+        profile: [synthetic_agreement(PROFILES[profile], seed) for seed in range(args.colleges)]
+        for profile in args.profile or PROFILES
+    }
+    if args.cache:
+        payload_sets["recorded"] = recorded_agreements(limit=args.cache_limit)
+
+    return payload_sets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the articulation pipeline without making requests.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    merge_parser = subparsers.add_parser("merge", help="merge every college of one subject with save_articulations")
+    merge_parser.add_argument("university", nargs="?", default="University of California, Santa Barbara")
+    merge_parser.add_argument("subject", nargs="?", default="PHYS")
+    merge_parser.add_argument("--repeat", type=int, default=5)
+
+    memory_parser = subparsers.add_parser("memory", help="compare the memory used by parsed JSON and by classes")
+    memory_parser.add_argument("universities", nargs="*", help="defaults to every university in the data folder")
+
+    pipeline_parser = subparsers.add_parser("pipeline", help="time each parsing and merging stage on agreement payloads")
+    templates_parser = subparsers.add_parser("templates", help="check and time the template walk against the "
+                                                               "original recursive one")
+
+    for payload_parser in (pipeline_parser, templates_parser):
+        payload_parser.add_argument("--profile", action="append", choices=PROFILES,
+                                    help="synthetic payload profile (repeatable, defaults to all of them)")
+        payload_parser.add_argument("--colleges", type=int, default=10, help="synthetic agreements per profile")
+        payload_parser.add_argument("--cache", action="store_true", help="also run agreements from the response cache")
+        payload_parser.add_argument("--cache-limit", type=int, default=200)
+        payload_parser.add_argument("--repeat", type=int, default=3)
+
+    args = parser.parse_args()
+
+    if args.benchmark == "merge":
+        if not bench_merge(args.university, args.subject, args.repeat):
+            sys.exit(1)
+    elif args.benchmark == "memory":
+        bench_memory(args.universities or get_university_names())
+    elif args.benchmark == "pipeline":
+        bench_pipeline(payload_sets_from_args(args), args.repeat)
+    elif args.benchmark == "templates":
+        if not bench_templates(payload_sets_from_args(args), args.repeat):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
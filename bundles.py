@@ -0,0 +1,148 @@
+import json
+import shutil
+import sys
+
+from files import write_json
+from pathlib import Path
+from reverse_index import get_university_names
+
+BUNDLES_DIR = Path("data/bundles")
+
+# Courses are packed into shards of about this many bytes. A shard always holds at least one course, so the
+# biggest courses get a shard to themselves.
+SHARD_BYTES = 64 * 1024
+
+
+# Matches the label the website shows for a receiving item.
+def course_label(row: dict) -> str:
+    if row["type"] == "COURSE":
+        return f"{row['key']} - {row.get('title') or ''}".strip()
+
+    if row["type"] == "SERIES":
+        return f"{row['key']} - {', '.join(course['title'] for course in row['courses'])}"
+
+    return row["key"]
+
+
+# Keeps only what script.js renders. Units, subjects, keys and empty notes make up most of a courses.json.
+def compact_node(node: dict) -> dict:
+    compact: dict = {"type": node["type"]}
+
+    if node["type"] == "GROUP":
+        compact["items"] = [compact_node(item) for item in node["items"]]
+        compact["conjunctions"] = node["conjunctions"]
+    else:
+        compact["items"] = [compact_course(item) for item in node["items"]]
+        if node.get("conjunction"):
+            compact["conjunction"] = node["conjunction"]
+
+    if node.get("notes"):
+        compact["notes"] = node["notes"]
+
+    return compact
+
+
+def compact_course(course: dict) -> dict:
+    compact = {"prefix": course["prefix"], "number": course["number"], "title": course["title"]}
+    if course.get("notes"):
+        compact["notes"] = course["notes"]
+
+    return compact
+
+
+def compact_articulations(row: dict) -> list[dict]:
+    return [
+        {"sending_name": articulation["sending_name"],
+         "sending_articulation": compact_node(articulation["sending_articulation"])}
+        for articulation in row["articulations"]
+    ]
+
+
+def shard_subject(rows: list[dict]) -> tuple[list[dict], list[dict[str, list[dict]]]]:
+    catalog: list[dict] = []
+    shards: list[dict[str, list[dict]]] = []
+    shard: dict[str, list[dict]] = {}
+    shard_size = 0
+
+    for row in rows:
+        entry = {"key": row["key"], "label": course_label(row)}
+        catalog.append(entry)
+
+        if not row["articulations"]:
+            continue
+
+        articulations = compact_articulations(row)
+        size = len(json.dumps(articulations, separators=(",", ":")))
+
+        if shard and shard_size + size > SHARD_BYTES:
+            shards.append(shard)
+            shard, shard_size = {}, 0
+
+        shard[row["key"]] = articulations
+        shard_size += size
+        entry["shard"] = len(shards)
+
+    if shard:
+        shards.append(shard)
+
+    return catalog, shards
+
+
+def export_university(university_name: str) -> None:
+    with open(Path(f"data/{university_name}/subjects.json"), "r") as f:
+        subjects: list[dict] = json.load(f)
+
+    university_dir = BUNDLES_DIR / university_name
+    catalog: list[dict] = []
+    written: set[Path] = set()
+
+    for subject in subjects:
+        courses_path = Path(f"data/{university_name}/{subject['prefix']}/courses.json")
+        if not courses_path.exists():
+            continue
+
+        with open(courses_path, "r") as f:
+            rows: list[dict] = json.load(f)
+
+        courses, shards = shard_subject(rows)
+        catalog.append({"prefix": subject["prefix"], "name": subject["name"], "courses": courses})
+
+        for number, shard in enumerate(shards):
+            shard_path = university_dir / subject["prefix"] / f"{number}.json"
+            write_json(shard_path, shard, compact=True)
+            written.add(shard_path)
+
+    catalog_path = university_dir / "catalog.json"
+    write_json(catalog_path, catalog, compact=True)
+    written.add(catalog_path)
+
+    # Subjects that shrank or went away would otherwise leave shards behind that nothing points to.
+    for path in sorted(university_dir.rglob("*.json")):
+        if path not in written:
+            path.unlink()
+
+    for directory in sorted(university_dir.iterdir()):
+        if directory.is_dir() and not any(directory.iterdir()):
+            directory.rmdir()
+
+
+def export_bundles() -> None:
+    print("Exporting website bundles.")
+
+    university_names = get_university_names()
+    for university_name in university_names:
+        export_university(university_name)
+
+    # Universities that no longer have data shouldn't keep serving an old catalog.
+    if BUNDLES_DIR.exists():
+        for directory in BUNDLES_DIR.iterdir():
+            if directory.is_dir() and directory.name not in university_names:
+                shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        for name in sys.argv[1:]:
+            export_university(name)
+    else:
+        export_bundles()
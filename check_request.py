@@ -0,0 +1,100 @@
+import argparse
+import request
+import sys
+import threading
+
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from request import RateLimiter
+
+
+# A stand-in for ASSIST that counts the connections made to it. /flaky fails with a 503 the first two times it's asked
+# for and then succeeds.
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    connections = 0
+    flaky_calls = 0
+    lock = threading.Lock()
+
+    def setup(self) -> None:
+        super().setup()
+        with self.lock:
+            StubHandler.connections += 1
+
+    def do_GET(self) -> None:
+        status = HTTPStatus.OK
+
+        if self.path.startswith("/flaky"):
+            with self.lock:
+                StubHandler.flaky_calls += 1
+                if StubHandler.flaky_calls <= 2:
+                    status = HTTPStatus.SERVICE_UNAVAILABLE
+
+        body = b'{"isSuccessful": true}' if status == HTTPStatus.OK else b"unavailable"
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+def check(passed: bool, message: str) -> bool:
+    print(f"{'ok' if passed else 'FAILED'}: {message}")
+    return passed
+
+
+def check_connection_reuse(base_url: str, count: int) -> bool:
+    StubHandler.connections = 0
+    responses = [request.get(f"{base_url}/ok", params={"n": i}) for i in range(count)]
+
+    return check(
+        all(response.status_code == 200 for response in responses) and StubHandler.connections == 1,
+        f"{count} requests used {StubHandler.connections} connection(s)"
+    )
+
+
+def check_retries(base_url: str) -> bool:
+    StubHandler.flaky_calls = 0
+    sent = request.limiter.sent
+    response = request.get(f"{base_url}/flaky")
+    retries = len(response.raw.retries.history)
+    charged = request.limiter.sent - sent
+
+    return check(
+        response.status_code == 200 and StubHandler.flaky_calls == 3 and retries == 2 and charged == 3,
+        f"503, 503, 200 ended with a {response.status_code} after {retries} retries, and {charged} requests were "
+        f"charged to the rate limiter"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check request.get's connection reuse and retries against a local "
+                                                 "stub server.")
+    parser.add_argument("--requests", type=int, default=20, help="requests that should share one connection")
+    args = parser.parse_args()
+
+    # Nothing here should touch the response cache or wait on ASSIST's rate limit.
+    request.cache.enabled = False
+    request.limiter = RateLimiter(args.requests * 10, 1, args.requests * 10)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    try:
+        passed = check_connection_reuse(base_url, args.requests)
+        passed = check_retries(base_url) and passed
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    if not passed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
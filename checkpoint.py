@@ -0,0 +1,61 @@
+import json
+import threading
+
+from files import write_json
+from pathlib import Path
+
+CHECKPOINT_PATH = Path("checkpoint.json")
+DEFAULT_CHECKPOINT_EVERY = 10
+
+
+# Tracks which (university, college) pairs have been merged and written to the data folder, so a crawl that dies
+# partway through can pick up where it left off. Everything merged before a checkpoint is already on disk, so
+# resuming only needs to skip those pairs.
+class Checkpoint:
+    def __init__(self, desired_universities: list[str], completed: dict[str, list[int]], finished: list[int]):
+        self.desired_universities = desired_universities
+        self.completed = completed
+        self.finished = finished
+        self.lock = threading.Lock()
+
+    def is_finished(self, university_id: int) -> bool:
+        return university_id in self.finished
+
+    def is_completed(self, university_id: int, college_id: int) -> bool:
+        return college_id in self.completed.get(str(university_id), [])
+
+    def complete(self, university_id: int, college_ids: list[int]) -> None:
+        with self.lock:
+            completed = self.completed.setdefault(str(university_id), [])
+            completed.extend(college_id for college_id in college_ids if college_id not in completed)
+            self.save()
+
+    def finish(self, university_id: int) -> None:
+        with self.lock:
+            self.finished.append(university_id)
+            self.completed.pop(str(university_id), None)
+            self.save()
+
+    def save(self) -> None:
+        write_json(CHECKPOINT_PATH, {
+            "universities": self.desired_universities,
+            "completed": self.completed,
+            "finished": self.finished
+        })
+
+    def clear(self) -> None:
+        CHECKPOINT_PATH.unlink(missing_ok=True)
+
+
+def load_checkpoint(desired_universities: list[str]) -> Checkpoint:
+    if not CHECKPOINT_PATH.exists():
+        print("No checkpoint was found. Starting from the beginning.")
+        return Checkpoint(desired_universities, {}, [])
+
+    with open(CHECKPOINT_PATH, "r") as f:
+        saved = json.load(f)
+
+    if sorted(saved["universities"]) != sorted(desired_universities):
+        print(f"The checkpoint was for {', '.join(saved['universities'])}. Resuming that run instead.")
+
+    return Checkpoint(saved["universities"], saved["completed"], saved["finished"])
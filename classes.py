@@ -1,4 +1,6 @@
-from dataclasses import asdict, dataclass
+import sys
+
+from dataclasses import dataclass
 from enum import Enum
 
 
@@ -14,17 +16,18 @@ class ReceivingType(str, Enum):
     GE = "GE"
 
 
-@dataclass
+@dataclass(slots=True)
 class Institution:
     id: int
     name: str
     category: str
 
     def to_dict(self) -> dict:
-        return asdict(self)
+        return {"id": self.id, "name": self.name, "category": self.category}
 
 
-@dataclass
+# Courses are never changed after they're made, which lets identical sending courses be shared (see SendingCourse.from_dict).
+@dataclass(slots=True, frozen=True)
 class BasicCourse:
     subject: str
     prefix: str
@@ -35,7 +38,15 @@ class BasicCourse:
     max_units: float
 
     def to_dict(self) -> dict:
-        return asdict(self)
+        return {
+            "subject": self.subject,
+            "prefix": self.prefix,
+            "number": self.number,
+            "key": self.key,
+            "title": self.title,
+            "min_units": self.min_units,
+            "max_units": self.max_units
+        }
 
     @staticmethod
     def from_assist(data: dict) -> "BasicCourse":
@@ -43,8 +54,8 @@ class BasicCourse:
         number = data["courseNumber"].strip()
 
         return BasicCourse(
-            subject=data["prefixDescription"].strip(),
-            prefix=prefix,
+            subject=sys.intern(data["prefixDescription"].strip()),
+            prefix=sys.intern(prefix),
             key=f"{prefix} {number}",
             number=number,
             title=data["courseTitle"].strip(),
@@ -52,10 +63,55 @@ class BasicCourse:
             max_units=float(data["maxUnits"])
         )
 
+    @staticmethod
+    def from_dict(data: dict) -> "BasicCourse":
+        return BasicCourse(
+            subject=sys.intern(data["subject"]),
+            prefix=sys.intern(data["prefix"]),
+            number=data["number"],
+            key=data["key"],
+            title=data["title"],
+            min_units=data["min_units"],
+            max_units=data["max_units"]
+        )
+
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class SendingCourse(BasicCourse):
-    notes: list[str]
+    notes: tuple[str, ...]
+
+    def to_dict(self) -> dict:
+        return {
+            "subject": self.subject,
+            "prefix": self.prefix,
+            "number": self.number,
+            "key": self.key,
+            "title": self.title,
+            "min_units": self.min_units,
+            "max_units": self.max_units,
+            "notes": list(self.notes)
+        }
+
+    # A college's course shows up in its agreement with every university, so loading a lot of articulations reads the
+    # same sending course thousands of times. Given a table that belongs to the load, every copy is swapped for the
+    # first one made, keyed by its whole value since notes can differ between agreements.
+    @staticmethod
+    def from_dict(data: dict, courses: dict["SendingCourse", "SendingCourse"] | None = None) -> "SendingCourse":
+        course = SendingCourse(
+            subject=sys.intern(data["subject"]),
+            prefix=sys.intern(data["prefix"]),
+            number=data["number"],
+            key=data["key"],
+            title=data["title"],
+            min_units=data["min_units"],
+            max_units=data["max_units"],
+            notes=tuple(data["notes"])
+        )
+
+        if courses is None:
+            return course
+
+        return courses.setdefault(course, course)
 
     @staticmethod
     def from_assist(obj: dict) -> "SendingCourse":
@@ -75,7 +131,7 @@ class SendingCourse(BasicCourse):
                 title="Missing Course",
                 min_units=-1.0,
                 max_units=-1.0,
-                notes=["This particular course is broken on ASSIST and displays an empty course."],
+                notes=("This particular course is broken on ASSIST and displays an empty course.",),
             )
 
         subject = obj["prefixDescription"].strip()
@@ -83,18 +139,18 @@ class SendingCourse(BasicCourse):
         number = obj["courseNumber"].strip()
 
         return SendingCourse(
-            subject=subject,
-            prefix=prefix,
+            subject=sys.intern(subject),
+            prefix=sys.intern(prefix),
             number=number,
             key=f"{prefix} {number}".strip(),
             title=obj["courseTitle"].strip(),
             min_units=float(obj["minUnits"]),
             max_units=float(obj["maxUnits"]),
-            notes=notes,
+            notes=tuple(notes),
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class SetArticulation:
     conjunction: Conjunction | None
     items: list[SendingCourse]
@@ -108,8 +164,16 @@ class SetArticulation:
             "notes": self.notes
         }
 
+    @staticmethod
+    def from_dict(data: dict, courses: dict[SendingCourse, SendingCourse] | None = None) -> "SetArticulation":
+        return SetArticulation(
+            conjunction=None if data["conjunction"] is None else Conjunction(data["conjunction"]),
+            items=[SendingCourse.from_dict(course, courses) for course in data["items"]],
+            notes=data["notes"]
+        )
+
 
-@dataclass
+@dataclass(slots=True)
 class GroupArticulation:
     conjunctions: list[Conjunction]
     items: list[SetArticulation]
@@ -123,8 +187,28 @@ class GroupArticulation:
             "notes": self.notes
         }
 
+    @staticmethod
+    def from_dict(data: dict, courses: dict[SendingCourse, SendingCourse] | None = None) -> "GroupArticulation":
+        return GroupArticulation(
+            conjunctions=[Conjunction(conjunction) for conjunction in data["conjunctions"]],
+            items=[articulation_from_dict(item, courses) for item in data["items"]],
+            notes=data["notes"]
+        )
+
+
+# Reads a saved sending articulation back into classes, e.g. to hold a lot of them in memory for analysis. Pass the
+# same courses table for everything in one load to share identical sending courses.
+def articulation_from_dict(
+    data: dict,
+    courses: dict[SendingCourse, SendingCourse] | None = None
+) -> SetArticulation | GroupArticulation:
+    if data["type"] == "GROUP":
+        return GroupArticulation.from_dict(data, courses)
+
+    return SetArticulation.from_dict(data, courses)
+
 
-@dataclass
+@dataclass(slots=True)
 class ReceivingSeries:
     key: str
     conjunction: Conjunction
@@ -138,7 +222,7 @@ class ReceivingSeries:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class ReceivingRequirement:
     kind: ReceivingType
     key: str
@@ -156,7 +240,7 @@ class ReceivingRequirement:
         return None
 
 
-@dataclass
+@dataclass(slots=True)
 class ReceivingItem:
     key: str
     receiving_type: ReceivingType
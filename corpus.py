@@ -0,0 +1,157 @@
+import gzip
+import json
+import sys
+
+from pathlib import Path
+
+from reverse_index import get_university_names
+
+CORPUS_PATH = Path("corpus.json.gz")
+CORPUS_VERSION = 1
+
+
+# Every JSON value in the data folder is stored once. Scalars (strings, units, nulls) go in "atoms", and lists and
+# dicts go in "nodes" as lists of references to their children, so the thousands of copies of the same sending course
+# or articulation tree all point at one entry. Dict keys are stored once per key order in "shapes".
+#
+# A reference below len(atoms) is an atom, anything else is a node. A node starts with its shape index, or -1 if
+# it's a list. Children are always added before their parents, so a node only refers to earlier entries.
+class CorpusWriter:
+    def __init__(self):
+        self.atoms: list = []
+        self.nodes: list[list[int]] = []
+        self.shapes: list[list[str]] = []
+
+        self.atom_refs: dict[tuple[type, object], int] = {}
+        self.node_refs: dict[tuple[int, ...], int] = {}
+        self.shape_refs: dict[tuple[str, ...], int] = {}
+
+        self.files: dict[str, int] = {}
+
+    def add(self, value) -> int:
+        if isinstance(value, dict):
+            shape = tuple(value.keys())
+            shape_ref = self.shape_refs.get(shape)
+            if shape_ref is None:
+                shape_ref = self.shape_refs[shape] = len(self.shapes)
+                self.shapes.append(list(shape))
+
+            node = (shape_ref, *(self.add(v) for v in value.values()))
+        elif isinstance(value, list):
+            node = (-1, *(self.add(v) for v in value))
+        else:
+            key = (type(value), value)
+            ref = self.atom_refs.get(key)
+            if ref is None:
+                ref = self.atom_refs[key] = len(self.atoms)
+                self.atoms.append(value)
+
+            return ref
+
+        ref = self.node_refs.get(node)
+        if ref is None:
+            ref = self.node_refs[node] = len(self.nodes)
+            self.nodes.append(list(node))
+
+        return ~ref
+
+    def add_file(self, relative_path: str) -> None:
+        with open(Path("data") / relative_path, "r") as f:
+            self.files[relative_path] = self.add(json.load(f))
+
+    def payload(self) -> dict:
+        # Node references are negative while writing since we don't know how many atoms there will be yet.
+        offset = len(self.atoms)
+
+        def fix(ref: int) -> int:
+            return ref if ref >= 0 else offset + ~ref
+
+        return {
+            "version": CORPUS_VERSION,
+            "atoms": self.atoms,
+            "shapes": self.shapes,
+            "nodes": [[node[0], *(fix(r) for r in node[1:])] for node in self.nodes],
+            "files": {path: fix(ref) for path, ref in self.files.items()}
+        }
+
+
+def collect_data_folder() -> CorpusWriter:
+    writer = CorpusWriter()
+    writer.add_file("institutions.json")
+
+    for university_name in get_university_names():
+        writer.add_file(f"{university_name}/subjects.json")
+
+        with open(Path(f"data/{university_name}/subjects.json"), "r") as f:
+            subjects: list[dict] = json.load(f)
+
+        for subject in subjects:
+            relative_path = f"{university_name}/{subject['prefix']}/courses.json"
+            if (Path("data") / relative_path).exists():
+                writer.add_file(relative_path)
+
+    return writer
+
+
+def export_corpus(output_path: Path = CORPUS_PATH) -> None:
+    print(f"Exporting data folder to {output_path}.")
+
+    with gzip.open(output_path, "wt", compresslevel=9) as out:
+        json.dump(collect_data_folder().payload(), out, separators=(",", ":"))
+
+
+class Corpus:
+    def __init__(self, payload: dict):
+        if payload.get("version") != CORPUS_VERSION:
+            raise ValueError(f"Unsupported corpus version {payload.get('version')}.")
+
+        self.atoms: list = payload["atoms"]
+        self.shapes: list[list[str]] = payload["shapes"]
+        self.nodes: list[list[int]] = payload["nodes"]
+        self.files: dict[str, int] = payload["files"]
+
+        # Shared subtrees are only built once, so they're also shared between the dicts we hand out.
+        self.decoded: dict[int, object] = {}
+
+    def decode(self, ref: int):
+        if ref < len(self.atoms):
+            return self.atoms[ref]
+
+        value = self.decoded.get(ref)
+        if value is not None:
+            return value
+
+        node = self.nodes[ref - len(self.atoms)]
+        children = [self.decode(child) for child in node[1:]]
+        value = children if node[0] < 0 else dict(zip(self.shapes[node[0]], children))
+
+        self.decoded[ref] = value
+        return value
+
+    def has(self, relative_path: str) -> bool:
+        return relative_path in self.files
+
+    def get(self, relative_path: str):
+        return self.decode(self.files[relative_path])
+
+    def get_institutions(self) -> list[dict]:
+        return self.get("institutions.json")
+
+    def get_subjects(self, university_name: str) -> list[dict]:
+        return self.get(f"{university_name}/subjects.json")
+
+    def get_courses(self, university_name: str, subject_prefix: str) -> list[dict]:
+        return self.get(f"{university_name}/{subject_prefix}/courses.json")
+
+
+def load_corpus(path: Path = CORPUS_PATH) -> Corpus:
+    with gzip.open(path, "rt") as f:
+        return Corpus(json.load(f))
+
+
+def load_data_folder() -> Corpus:
+    return Corpus(collect_data_folder().payload())
+
+
+if __name__ == "__main__":
+    export_corpus(Path(sys.argv[1]) if len(sys.argv) > 1 else CORPUS_PATH)
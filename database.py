@@ -0,0 +1,234 @@
+import json
+import sqlite3
+
+from pathlib import Path
+
+from reverse_index import collect_sending_keys, get_university_names
+
+DATABASE_PATH = Path("assist.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS institutions (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    category TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS subjects (
+    university TEXT NOT NULL,
+    prefix TEXT NOT NULL,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (university, prefix)
+);
+
+CREATE TABLE IF NOT EXISTS receiving_items (
+    id INTEGER PRIMARY KEY,
+    university TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    type TEXT NOT NULL,
+    receiving TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sending_courses (
+    id INTEGER PRIMARY KEY,
+    college TEXT NOT NULL,
+    key TEXT NOT NULL,
+    UNIQUE (college, key)
+);
+
+CREATE TABLE IF NOT EXISTS articulations (
+    id INTEGER PRIMARY KEY,
+    receiving_item_id INTEGER NOT NULL REFERENCES receiving_items (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    college TEXT NOT NULL,
+    tree TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS articulation_courses (
+    articulation_id INTEGER NOT NULL REFERENCES articulations (id) ON DELETE CASCADE,
+    sending_course_id INTEGER NOT NULL REFERENCES sending_courses (id),
+    PRIMARY KEY (articulation_id, sending_course_id)
+);
+
+CREATE INDEX IF NOT EXISTS receiving_items_subject ON receiving_items (university, subject, position);
+CREATE INDEX IF NOT EXISTS receiving_items_key ON receiving_items (key, university);
+CREATE INDEX IF NOT EXISTS articulations_item ON articulations (receiving_item_id, position);
+CREATE INDEX IF NOT EXISTS articulations_college ON articulations (college);
+CREATE INDEX IF NOT EXISTS articulation_courses_course ON articulation_courses (sending_course_id);
+"""
+
+
+def connect(path: Path = DATABASE_PATH) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+
+    return conn
+
+
+def ingest_institutions(conn: sqlite3.Connection, institutions: list[dict]) -> None:
+    conn.executemany(
+        "INSERT OR REPLACE INTO institutions (id, name, category) VALUES (:id, :name, :category)",
+        institutions
+    )
+
+
+def get_sending_course_id(conn: sqlite3.Connection, college: str, key: str, known: dict[tuple[str, str], int]) -> int:
+    sending_id = known.get((college, key))
+
+    if sending_id is None:
+        conn.execute("INSERT OR IGNORE INTO sending_courses (college, key) VALUES (?, ?)", (college, key))
+        sending_id = conn.execute(
+            "SELECT id FROM sending_courses WHERE college = ? AND key = ?", (college, key)
+        ).fetchone()["id"]
+        known[(college, key)] = sending_id
+
+    return sending_id
+
+
+def ingest_university(
+    conn: sqlite3.Connection,
+    university_name: str,
+    subjects: list[dict],
+    rows_by_subject_dir: dict[str, list[dict]]
+) -> None:
+    # Deleting the receiving items cascades to their articulations, so re-ingesting a university replaces it.
+    conn.execute("DELETE FROM receiving_items WHERE university = ?", (university_name,))
+    conn.execute("DELETE FROM subjects WHERE university = ?", (university_name,))
+
+    known_sending_ids: dict[tuple[str, str], int] = {}
+
+    conn.executemany(
+        "INSERT INTO subjects (university, prefix, name, position) VALUES (?, ?, ?, ?)",
+        [(university_name, s["prefix"], s["name"], i) for i, s in enumerate(subjects)]
+    )
+
+    for subject_dir, rows in rows_by_subject_dir.items():
+        for position, row in enumerate(rows):
+            receiving = {k: v for k, v in row.items() if k != "articulations"}
+            item_id = conn.execute(
+                "INSERT INTO receiving_items (university, subject, position, key, type, receiving) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (university_name, subject_dir, position, row["key"], row["type"], json.dumps(receiving))
+            ).lastrowid
+
+            for art_position, articulation in enumerate(row.get("articulations") or []):
+                college = articulation["sending_name"]
+                tree = articulation["sending_articulation"]
+                articulation_id = conn.execute(
+                    "INSERT INTO articulations (receiving_item_id, position, college, tree) VALUES (?, ?, ?, ?)",
+                    (item_id, art_position, college, json.dumps(tree))
+                ).lastrowid
+
+                sending_keys: set[str] = set()
+                collect_sending_keys(tree, sending_keys)
+                conn.executemany(
+                    "INSERT OR IGNORE INTO articulation_courses (articulation_id, sending_course_id) VALUES (?, ?)",
+                    [(articulation_id, get_sending_course_id(conn, college, key, known_sending_ids)) for key in sending_keys]
+                )
+
+
+def build_database(path: Path = DATABASE_PATH) -> None:
+    print(f"Building articulation database at {path}.")
+
+    path.unlink(missing_ok=True)
+    conn = connect(path)
+
+    with conn:
+        with open(Path("data/institutions.json"), "r") as f:
+            ingest_institutions(conn, json.load(f))
+
+        for university_name in get_university_names():
+            with open(Path(f"data/{university_name}/subjects.json"), "r") as f:
+                subjects: list[dict] = json.load(f)
+
+            rows_by_subject_dir: dict[str, list[dict]] = {}
+            for subject in subjects:
+                courses_path = Path(f"data/{university_name}/{subject['prefix']}/courses.json")
+                if courses_path.exists():
+                    with open(courses_path, "r") as f:
+                        rows_by_subject_dir[subject["prefix"]] = json.load(f)
+
+            ingest_university(conn, university_name, subjects, rows_by_subject_dir)
+
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def get_universities(conn: sqlite3.Connection) -> list[dict]:
+    rows = conn.execute(
+        "SELECT id, name, category FROM institutions WHERE category != 'CCC' ORDER BY name"
+    ).fetchall()
+
+    return [dict(row) for row in rows]
+
+
+def get_subjects(conn: sqlite3.Connection, university_name: str) -> list[dict]:
+    rows = conn.execute(
+        "SELECT prefix, name FROM subjects WHERE university = ? ORDER BY position", (university_name,)
+    ).fetchall()
+
+    return [dict(row) for row in rows]
+
+
+def get_articulations(conn: sqlite3.Connection, receiving_item_id: int) -> list[dict]:
+    rows = conn.execute(
+        "SELECT college, tree FROM articulations WHERE receiving_item_id = ? ORDER BY position", (receiving_item_id,)
+    ).fetchall()
+
+    return [{"sending_name": row["college"], "sending_articulation": json.loads(row["tree"])} for row in rows]
+
+
+def get_courses(conn: sqlite3.Connection, university_name: str, subject_prefix: str) -> list[dict]:
+    rows = conn.execute(
+        "SELECT id, receiving FROM receiving_items WHERE university = ? AND subject = ? ORDER BY position",
+        (university_name, subject_prefix)
+    ).fetchall()
+
+    return [{**json.loads(row["receiving"]), "articulations": get_articulations(conn, row["id"])} for row in rows]
+
+
+def get_course(conn: sqlite3.Connection, university_name: str, key: str) -> dict | None:
+    row = conn.execute(
+        "SELECT id, receiving FROM receiving_items WHERE key = ? AND university = ? LIMIT 1", (key, university_name)
+    ).fetchone()
+
+    if row is None:
+        return None
+
+    return {**json.loads(row["receiving"]), "articulations": get_articulations(conn, row["id"])}
+
+
+def get_college_articulations(conn: sqlite3.Connection, college_name: str) -> list[dict]:
+    rows = conn.execute(
+        "SELECT DISTINCT r.university, r.key, a.tree FROM articulations a "
+        "JOIN receiving_items r ON r.id = a.receiving_item_id "
+        "WHERE a.college = ? ORDER BY r.university, r.key",
+        (college_name,)
+    ).fetchall()
+
+    return [
+        {"university": row["university"], "key": row["key"], "sending_articulation": json.loads(row["tree"])}
+        for row in rows
+    ]
+
+
+def get_accepting_universities(conn: sqlite3.Connection, college_name: str, sending_key: str) -> list[list[str]]:
+    rows = conn.execute(
+        "SELECT DISTINCT r.university, r.subject, r.key FROM sending_courses s "
+        "JOIN articulation_courses ac ON ac.sending_course_id = s.id "
+        "JOIN articulations a ON a.id = ac.articulation_id "
+        "JOIN receiving_items r ON r.id = a.receiving_item_id "
+        "WHERE s.college = ? AND s.key = ? GROUP BY r.university, r.key ORDER BY r.university, r.subject, r.key",
+        (college_name, sending_key)
+    ).fetchall()
+
+    return [[row["university"], row["subject"], row["key"]] for row in rows]
+
+
+if __name__ == "__main__":
+    build_database()
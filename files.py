@@ -0,0 +1,60 @@
+import json
+import os
+import tempfile
+
+from pathlib import Path
+
+# Set to None (--compact) to write data files without indentation.
+indent: int | None = 4
+
+# The umask can only be read by setting it, so it's done once here rather than while other threads create files.
+umask = os.umask(0)
+os.umask(umask)
+
+
+# mkstemp creates files only the owner can read. Replaced files keep their mode and new ones get the usual default,
+# so anything else serving the data folder can still read it.
+def file_mode(path: Path) -> int:
+    try:
+        return path.stat().st_mode & 0o777
+    except OSError:
+        return 0o666 & ~umask
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+
+        os.chmod(tmp, file_mode(path))
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def is_unchanged(path: Path, data: bytes) -> bool:
+    try:
+        if path.stat().st_size != len(data):
+            return False
+
+        return path.read_bytes() == data
+    except OSError:
+        return False
+
+
+# compact is for generated files (indexes, bundles) that are only read by code, so they're never indented.
+def write_json(path: Path, payload, compact: bool = False) -> bool:
+    file_indent = None if compact else indent
+    separators = None if file_indent is not None else (",", ":")
+    data = json.dumps(payload, indent=file_indent, separators=separators).encode()
+
+    # Skipping identical rewrites keeps the weekly data commits down to what actually changed.
+    if is_unchanged(path, data):
+        return False
+
+    write_atomic(path, data)
+    return True
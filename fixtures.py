@@ -0,0 +1,181 @@
+import gzip
+import json
+import random
+
+from dataclasses import dataclass
+from pathlib import Path
+
+from request import CACHE_DIR
+
+SUBJECTS = [
+    ("MATH", "Mathematics"),
+    ("PHYS", "Physics"),
+    ("CHEM", "Chemistry"),
+    ("BIOL", "Biology"),
+    ("ENGL", "English"),
+    ("HIST", "History"),
+    ("CS", "Computer Science"),
+    ("ECON", "Economics"),
+]
+
+NOTES = [
+    "Course must be taken at the same college.",
+    "Must complete both courses to receive credit.",
+    "Credit for this course is limited.",
+]
+
+
+# The shape of one synthetic agreement. AllMajors agreements are a flat list of articulations, AllDepartments ones
+# are split into departments, and template_cells controls how big (and how deeply nested) the template assets are.
+@dataclass
+class Profile:
+    method: str
+    rows: int
+    departments: int = 1
+    template_cells: int = 0
+    template_depth: int = 3
+
+
+PROFILES = {
+    "majors-small": Profile("AllMajors", rows=40, template_cells=40),
+    "majors-large": Profile("AllMajors", rows=800, template_cells=400),
+    "departments": Profile("AllDepartments", rows=800, departments=30, template_cells=400),
+    "templates-heavy": Profile("AllMajors", rows=100, template_cells=8000, template_depth=8),
+}
+
+
+def assist_course(rng: random.Random, notes: bool = False) -> dict:
+    prefix, subject = rng.choice(SUBJECTS)
+    number = f"{rng.randint(1, 199)}{rng.choice(['', '', 'A', 'B', 'H'])}"
+
+    return {
+        "prefix": prefix,
+        "courseNumber": number,
+        "courseTitle": f"{subject} {number}",
+        "prefixDescription": subject,
+        "minUnits": rng.choice([3.0, 4.0, 5.0]),
+        "maxUnits": 5.0,
+        "attributes": [{"content": rng.choice(NOTES)}] if notes and rng.random() < 0.2 else []
+    }
+
+
+def sending_articulation(rng: random.Random) -> dict:
+    if rng.random() < 0.1:
+        return {"items": [], "noArticulationReason": "No course articulated", "attributes": []}
+
+    groups = []
+    for position in range(rng.choice([1, 1, 1, 2, 3])):
+        items = [
+            {"type": "Course", "position": i, **assist_course(rng, notes=True)}
+            for i in range(rng.choice([1, 1, 2, 3]))
+        ]
+        groups.append({
+            "type": "CourseGroup",
+            "position": position,
+            "courseConjunction": rng.choice(["And", "Or"]),
+            "items": items,
+            "attributes": []
+        })
+
+    conjunctions = []
+    if len(groups) > 1 and rng.random() < 0.5:
+        conjunctions.append({
+            "groupConjunction": rng.choice(["And", "Or"]),
+            "sendingCourseGroupBeginPosition": 0,
+            "sendingCourseGroupEndPosition": len(groups) - 1
+        })
+
+    return {
+        "items": groups,
+        "courseGroupConjunctions": conjunctions,
+        "attributes": [{"content": rng.choice(NOTES)}] if rng.random() < 0.1 else [],
+        "noArticulationReason": None
+    }
+
+
+def articulation(rng: random.Random) -> dict:
+    kind = rng.random()
+    row: dict = {"sendingArticulation": sending_articulation(rng)}
+
+    if kind < 0.8:
+        row.update(type="Course", course=assist_course(rng))
+    elif kind < 0.9:
+        courses = [assist_course(rng) for _ in range(rng.randint(2, 3))]
+        row.update(type="Series", series={"conjunction": rng.choice(["And", "Or"]), "courses": courses})
+    elif kind < 0.95:
+        row.update(type="Requirement", requirement={"name": f"Requirement {rng.randint(1, 50)}"})
+    else:
+        row.update(type="GeneralEducation", generalEducationArea={"name": f"Area {rng.randint(1, 9)}"})
+
+    return row
+
+
+def template_cell(rng: random.Random, cell: int) -> dict:
+    kind = rng.random()
+
+    if kind < 0.8:
+        return {"id": f"cell-{cell}", "type": "Course", "course": assist_course(rng)}
+    if kind < 0.9:
+        courses = [assist_course(rng) for _ in range(rng.randint(2, 3))]
+        return {"id": f"cell-{cell}", "type": "Series", "series": {"conjunction": "And", "courses": courses}}
+
+    return {"id": f"cell-{cell}", "type": "Requirement", "requirement": {"name": f"Requirement {rng.randint(1, 50)}"}}
+
+
+# Real template assets nest requirement groups inside sections inside rows. Here the nesting is repeated until the
+# requested depth so the walk has to go through a lot of structure to find each cell.
+def template_assets(rng: random.Random, profile: Profile) -> list[dict]:
+    cells = [template_cell(rng, cell) for cell in range(profile.template_cells)]
+    groups = []
+
+    for start in range(0, len(cells), 20):
+        node: dict = {"type": "RequirementGroup", "rows": [{"cells": cells[start:start + 20]}]}
+        for level in range(profile.template_depth - 1):
+            node = {"type": "Section", "position": level, "sections": [node], "attributes": []}
+        groups.append(node)
+
+    return groups
+
+
+def synthetic_agreement(profile: Profile, seed: int) -> dict:
+    rng = random.Random(seed)
+    rows = [articulation(rng) for _ in range(profile.rows)]
+
+    # iter_articulation_rows only keeps the template cell of All Majors rows, so departments don't get one. Every fourth
+    # template cell is skipped so some cells have no articulation row and end up in the template inventory.
+    if profile.method == "AllDepartments":
+        size = -(-len(rows) // profile.departments)
+        articulations = [{"articulations": rows[i:i + size]} for i in range(0, len(rows), size)]
+    else:
+        articulations = [
+            {"templateCellId": f"cell-{cell + cell // 3}", "articulation": row} for cell, row in enumerate(rows)
+        ]
+
+    return {
+        "isSuccessful": True,
+        "result": {
+            "articulations": json.dumps(articulations),
+            "templateAssets": json.dumps(template_assets(rng, profile))
+        }
+    }
+
+
+# Agreements saved in the response cache by earlier crawls, so real payloads can be benchmarked without requests.
+def recorded_agreements(directory: Path = CACHE_DIR, limit: int | None = None) -> list[dict]:
+    agreements: list[dict] = []
+
+    for path in sorted((directory / "objects").glob("*/*.gz")):
+        with gzip.open(path, "rb") as f:
+            try:
+                payload = json.loads(f.read())
+            except ValueError:
+                continue
+
+        result = payload.get("result") if isinstance(payload, dict) and payload.get("isSuccessful") else None
+        if isinstance(result, dict) and "articulations" in result and "templateAssets" in result:
+            agreements.append(payload)
+
+        if limit is not None and len(agreements) >= limit:
+            break
+
+    return agreements
@@ -2,6 +2,7 @@ import json
 import request
 
 from classes import Institution
+from files import write_json
 from pathlib import Path
 
 
@@ -52,10 +53,7 @@ def create_institutions_file() -> list[Institution]:
     raw_institutions = get_institutions_json()
     formatted_institutions = reformat_institutions(raw_institutions)
 
-    output_file = Path("data/institutions.json")
-    output_file.parent.mkdir(exist_ok=True, parents=True)
-    with open(output_file, "w") as out:
-        json.dump([i.to_dict() for i in formatted_institutions], out, indent=4)
+    write_json(Path("data/institutions.json"), [i.to_dict() for i in formatted_institutions])
 
     return formatted_institutions
 
@@ -0,0 +1,153 @@
+import json
+import math
+import threading
+import time
+
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+TRACE_PATH = Path("trace.jsonl")
+PERCENTILES = (50, 90, 99)
+
+
+# What one piece of work (usually fetching and merging one college/university pair) spent its time on, plus counters
+# like requests and bytes. A stage that happens more than once, like a retried request, adds up.
+class Span:
+    def __init__(self, kind: str, **fields):
+        self.kind = kind
+        self.fields = fields
+        self.started = time.time()
+        self.stages: dict[str, float] = {}
+        self.counters: dict[str, int] = {}
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "started": round(self.started, 3),
+            **self.fields,
+            "stage_ms": {stage: round(seconds * 1000, 3) for stage, seconds in self.stages.items()},
+            **self.counters
+        }
+
+
+# The span the current thread is working for, so code deep in the crawl (like request.get) can report to it without
+# being passed one. Nothing is recorded when no span is active.
+current = threading.local()
+
+
+def get_current() -> Span | None:
+    return getattr(current, "span", None)
+
+
+@contextmanager
+def activate(span: Span):
+    previous = get_current()
+    current.span = span
+    try:
+        yield span
+    finally:
+        current.span = previous
+
+
+@contextmanager
+def stage(name: str):
+    span = get_current()
+    if span is None:
+        yield
+    else:
+        with span.stage(name):
+            yield
+
+
+def add_time(name: str, seconds: float) -> None:
+    span = get_current()
+    if span is not None:
+        span.add_time(name, seconds)
+
+
+def count(name: str, amount: int = 1) -> None:
+    span = get_current()
+    if span is not None:
+        span.count(name, amount)
+
+
+def percentile(ordered: list[float], p: float) -> float:
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+# Finished spans are written as JSON lines (when a trace file is open) and their stage times are kept for the summary.
+class Recorder:
+    def __init__(self):
+        self.file = None
+        self.lock = threading.Lock()
+        self.durations: defaultdict[str, list[float]] = defaultdict(list)
+        self.totals: defaultdict[str, int] = defaultdict(int)
+
+    def open(self, path: Path) -> None:
+        self.file = open(path, "w")
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def emit(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), separators=(",", ":"))
+
+        with self.lock:
+            if self.file is not None:
+                self.file.write(line + "\n")
+                self.file.flush()
+
+            for name, seconds in span.stages.items():
+                self.durations[f"{span.kind}.{name}"].append(seconds)
+            for name, amount in span.counters.items():
+                self.totals[f"{span.kind}.{name}"] += amount
+
+    @contextmanager
+    def record(self, kind: str, **fields):
+        with self.resume(Span(kind, **fields)) as span:
+            yield span
+
+    # Makes an existing span current again and emits it when done, for spans that are started in one thread and
+    # finished in another.
+    @contextmanager
+    def resume(self, span: Span):
+        try:
+            with activate(span):
+                yield span
+        finally:
+            self.emit(span)
+
+    def print_summary(self) -> None:
+        if not self.durations:
+            return
+
+        header = "".join(f"{f'p{p} ms':>10}" for p in PERCENTILES)
+        print(f"{'Stage':<28}{'count':>8}{'total s':>10}{header}{'max ms':>10}")
+
+        for name in sorted(self.durations):
+            ordered = sorted(self.durations[name])
+            columns = "".join(f"{percentile(ordered, p) * 1000:>10.1f}" for p in PERCENTILES)
+            print(f"{name:<28}{len(ordered):>8}{sum(ordered):>10.1f}{columns}{ordered[-1] * 1000:>10.1f}")
+
+        for name in sorted(self.totals):
+            print(f"{name}: {self.totals[name]}")
+
+
+recorder = Recorder()
@@ -0,0 +1,101 @@
+import json
+import re
+
+from collections.abc import Callable, Iterator
+from typing import TextIO
+
+CHUNK_SIZE = 256 * 1024
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+NUMBER_TAIL = re.compile(r"[0-9.eE+\-]*")
+
+
+# Yields the elements of a top-level JSON array one at a time, so only the element being decoded and one chunk of the
+# file have to be in memory. Stopping early skips reading the rest of the file.
+def iter_array(file: TextIO, chunk_size: int = CHUNK_SIZE) -> Iterator:
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+
+    def read_more(size: int) -> None:
+        nonlocal buffer, position, eof
+        chunk = file.read(size)
+        buffer = buffer[position:] + chunk
+        position = 0
+        eof = not chunk
+
+    def next_char() -> str:
+        nonlocal position
+        while True:
+            position = WHITESPACE.match(buffer, position).end()
+            if position < len(buffer):
+                return buffer[position]
+            if eof:
+                return ""
+            read_more(chunk_size)
+
+    if next_char() != "[":
+        raise ValueError("Expected a JSON array")
+    position += 1
+
+    if next_char() == "]":
+        return
+
+    while True:
+        next_char()
+
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = None
+
+            # A number that runs up to the end of the buffer might continue in the next chunk.
+            if end is not None and (eof or NUMBER_TAIL.match(buffer, end).end() < len(buffer)):
+                break
+
+            # Grow by at least what's buffered so far, so an element spanning many chunks is decoded in O(log n) tries.
+            read_more(max(chunk_size, len(buffer) - position))
+
+        position = end
+        yield value
+
+        separator = next_char()
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError(f"Expected ',' or ']' but found {separator!r}")
+        position += 1
+
+
+# The same for an array that's already in memory as a string. Elements are decoded straight out of it, where wrapping it
+# in a StringIO would copy the whole string (at up to four bytes per character) first.
+def iter_text_array(text: str) -> Iterator:
+    decoder = json.JSONDecoder()
+    position = WHITESPACE.match(text).end()
+
+    if text[position:position + 1] != "[":
+        raise ValueError("Expected a JSON array")
+    position = WHITESPACE.match(text, position + 1).end()
+
+    if text[position:position + 1] == "]":
+        return
+
+    while True:
+        value, position = decoder.raw_decode(text, position)
+        yield value
+
+        position = WHITESPACE.match(text, position).end()
+        separator = text[position:position + 1]
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError(f"Expected ',' or ']' but found {separator!r}")
+        position = WHITESPACE.match(text, position + 1).end()
+
+
+def find_in_array(file: TextIO, predicate: Callable[[object], bool]):
+    return next((element for element in iter_array(file) if predicate(element)), None)
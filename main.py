@@ -1,7 +1,29 @@
+import argparse
+import database
 import json
+import sqlite3
+import sys
 
+from collections import OrderedDict
+from jsonstream import find_in_array
 from pathlib import Path
 
+from reverse_index import get_reverse_articulations, reverse_index_path
+from search_index import INDEX_PATH, RECEIVING, SearchIndex, load_search_index
+
+# The SQLite database is optional. Without it, everything is read straight from the data folder.
+db: sqlite3.Connection | None = database.connect() if database.DATABASE_PATH.exists() else None
+
+# Loaded the first time a keyword search is made.
+search_index: SearchIndex | None = None
+
+# Parsed data files, most recently used last. Keys include the mtime, so a file rewritten by a crawl is read again.
+JSON_CACHE_SIZE = 8
+json_cache: OrderedDict[tuple[Path, int], list[dict]] = OrderedDict()
+
+# Batch queries are read and answered this many lines at a time, so results come out while input is still coming in.
+BATCH_CHUNK_SIZE = 1000
+
 
 def upper_conj(c: str | None) -> str:
     return (c or "").upper()
@@ -53,10 +75,27 @@ def print_articulation(articulation: dict) -> None:
     print(format_node(node))
 
 
+def load_json(path: Path) -> list[dict]:
+    key = (path, path.stat().st_mtime_ns)
+
+    if key in json_cache:
+        json_cache.move_to_end(key)
+        return json_cache[key]
+
+    with open(path, "r") as f:
+        json_cache[key] = json.load(f)
+
+    while len(json_cache) > JSON_CACHE_SIZE:
+        json_cache.popitem(last=False)
+
+    return json_cache[key]
+
+
 def get_universities() -> list[dict]:
-    institutions_path = Path("data/institutions.json")
-    with open(institutions_path, "r") as institutions_file:
-        institutions: list[dict] = json.load(institutions_file)
+    if db is not None:
+        return [u for u in database.get_universities(db) if u["category"] in ["UC", "CSU"]]
+
+    institutions: list[dict] = load_json(Path("data/institutions.json"))
 
     universities = [institution for institution in institutions if institution["category"] in ["UC", "CSU"]]
     universities.sort(key=lambda x: x["name"])
@@ -64,16 +103,42 @@ def get_universities() -> list[dict]:
     return universities
 
 
+def get_colleges() -> list[dict]:
+    institutions: list[dict] = load_json(Path("data/institutions.json"))
+
+    colleges = [institution for institution in institutions if institution["category"] == "CCC"]
+    colleges.sort(key=lambda x: x["name"])
+
+    return colleges
+
+
 def get_subjects(university_name: str) -> list[dict]:
-    subjects_path = Path(f"data/{university_name}/subjects.json")
-    with open(subjects_path, "r") as subjects_file:
-        return json.load(subjects_file)
+    if db is not None:
+        return database.get_subjects(db, university_name)
+
+    return load_json(Path(f"data/{university_name}/subjects.json"))
 
 
 def get_course_numbers(university_name: str, subject_prefix: str):
+    if db is not None:
+        return database.get_courses(db, university_name, subject_prefix)
+
+    return load_json(Path(f"data/{university_name}/{subject_prefix}/courses.json"))
+
+
+# Looking up one course doesn't need the whole subject, so unless it's already been parsed, the file is read only up
+# to that course.
+def get_course(university_name: str, subject_prefix: str, key: str) -> dict | None:
+    if db is not None:
+        return database.get_course(db, university_name, key)
+
     courses_path = Path(f"data/{university_name}/{subject_prefix}/courses.json")
-    with open(courses_path, "r") as courses_file:
-        return json.load(courses_file)
+    cached = json_cache.get((courses_path, courses_path.stat().st_mtime_ns))
+    if cached is not None:
+        return next((course for course in cached if course["key"] == key), None)
+
+    with open(courses_path, "r") as f:
+        return find_in_array(f, lambda course: course["key"] == key)
 
 
 def university_input() -> str:
@@ -118,6 +183,61 @@ def handle_courses(university: str, subject: dict) -> dict:
     return courses[int(input("Select the number of the course: ")) - 1]
 
 
+def college_input() -> str:
+    colleges = get_colleges()
+    for i, college in enumerate(colleges, 1):
+        print(f"{i}: {college["name"]}")
+
+    return colleges[int(input("Select the number of the college: ")) - 1]["name"]
+
+
+def print_reverse_articulations(college: str, sending_key: str) -> None:
+    if db is None and not reverse_index_path(college).exists():
+        print(f"There is no reverse index for {college}. Build it with: python reverse_index.py")
+        return
+
+    print(f"\n=== {college} {sending_key} articulates to ===")
+
+    if db is not None:
+        matches = database.get_accepting_universities(db, college, sending_key)
+    else:
+        matches = get_reverse_articulations(college, sending_key)
+
+    if len(matches) == 0:
+        print("This course does not articulate to any university courses.")
+        return
+
+    for university, _, receiving_key in matches:
+        print(f"{university}: {receiving_key}")
+
+
+def keyword_search() -> None:
+    global search_index
+
+    if not INDEX_PATH.exists():
+        print("There is no search index. Build one with: python search_index.py")
+        return
+
+    if search_index is None:
+        search_index = load_search_index()
+
+    matches = search_index.search(input("Enter a course or keywords (e.g. linear algebra): "))
+    if len(matches) == 0:
+        print("No courses matched.")
+        return
+
+    for i, (_, institution, _, key, title) in enumerate(matches, 1):
+        label = f"{key} - {title}" if title else key
+        print(f"{i}: {label} ({institution})")
+
+    kind, institution, subject_prefix, key, _ = matches[int(input("Select the number of the course: ")) - 1]
+
+    if kind == RECEIVING:
+        print_articulations(get_course(institution, subject_prefix, key))
+    else:
+        print_reverse_articulations(institution, key)
+
+
 def print_articulations(course: dict) -> None:
     print(f"\n=== Articulations for {course["key"]} ===")
 
@@ -131,17 +251,150 @@ def print_articulations(course: dict) -> None:
             print_articulation(articulation)
 
 
-def main():
+# Course keys are upper case with single spaces, but requirement keys are free text, so try the key as given first.
+def key_variants(key: str) -> list[str]:
+    return list(dict.fromkeys([key.strip(), " ".join(key.upper().split())]))
+
+
+# Course keys start with their subject's prefix, and some prefixes contain spaces, so the longest match wins.
+def find_subject(university_name: str, key: str) -> str | None:
+    prefixes = [subject["prefix"] for subject in get_subjects(university_name)]
+    return max((p for p in prefixes if key == p or key.startswith(f"{p} ")), key=len, default=None)
+
+
+# Answers a batch of queries, loading each subject or reverse index once no matter how many queries use it. A query
+# is either {"university", "key"} (with an optional "subject") for a university course's articulations, or
+# {"college", "key"} (with an optional "university" to filter by) for where a college course transfers.
+def answer_queries(queries: list) -> list[dict]:
+    results: list[dict] = [{"query": query} for query in queries]
+    by_subject: dict[tuple[str, str], list[int]] = {}
+    by_college: dict[str, list[int]] = {}
+
+    for i, query in enumerate(queries):
+        if not isinstance(query, dict) or not isinstance(query.get("key"), str):
+            results[i]["error"] = "Queries need a key and either a university or a college."
+        elif any(not isinstance(query[field], str) for field in ("college", "university", "subject") if field in query):
+            results[i]["error"] = "The college, university, and subject of a query have to be strings."
+        elif "college" in query:
+            by_college.setdefault(query["college"], []).append(i)
+        elif "university" in query:
+            try:
+                subject = query.get("subject") or find_subject(query["university"], key_variants(query["key"])[-1])
+            except FileNotFoundError:
+                results[i]["error"] = "Unknown university."
+                continue
+
+            if subject is None:
+                results[i]["error"] = "No subject matches this key. Add the subject to the query."
+            else:
+                by_subject.setdefault((query["university"], subject), []).append(i)
+        else:
+            results[i]["error"] = "Queries need a key and either a university or a college."
+
+    for (university_name, subject_prefix), indexes in by_subject.items():
+        try:
+            courses = {course["key"]: course for course in get_course_numbers(university_name, subject_prefix)}
+        except FileNotFoundError:
+            courses = {}
+
+        for i in indexes:
+            course = next((courses[key] for key in key_variants(queries[i]["key"]) if key in courses), None)
+            if course is None:
+                results[i]["error"] = "Course not found."
+            else:
+                results[i]["course"] = course
+
+    for college_name, indexes in by_college.items():
+        if db is None and not reverse_index_path(college_name).exists():
+            for i in indexes:
+                results[i]["error"] = "Unknown college, or the reverse index hasn't been built (python reverse_index.py)."
+            continue
+
+        reverse_index = load_json(reverse_index_path(college_name)) if db is None else None
+
+        for i in indexes:
+            matches: list[list[str]] = []
+            for key in key_variants(queries[i]["key"]):
+                if db is not None:
+                    matches = database.get_accepting_universities(db, college_name, key)
+                else:
+                    matches = reverse_index.get(key, [])
+
+                if matches:
+                    break
+
+            if "university" in queries[i]:
+                matches = [match for match in matches if match[0] == queries[i]["university"]]
+
+            results[i]["matches"] = matches
+
+    return results
+
+
+def write_results(queries: list) -> None:
+    for result in answer_queries(queries):
+        sys.stdout.write(json.dumps(result, separators=(",", ":")) + "\n")
+
+    sys.stdout.flush()
+
+
+# Queries are grouped within each chunk. Files a later chunk needs again usually come from load_json's cache.
+def run_batch(file) -> None:
+    queries: list = []
+    for line in file:
+        if not line.strip():
+            continue
+
+        try:
+            queries.append(json.loads(line))
+        except json.JSONDecodeError:
+            queries.append(line.rstrip("\n"))
+
+        if len(queries) >= BATCH_CHUNK_SIZE:
+            write_results(queries)
+            queries = []
+
+    write_results(queries)
+
+
+def interactive():
     while True:
-        university: str = university_input()
-        subject: dict = subject_input(university)
-        course: dict = handle_courses(university, subject)
-        print_articulations(course)
+        print("1: Search by university course")
+        print("2: Search by community college course")
+        print("3: Search by keyword")
+
+        search_type = input("Select the type of search: ")
+        if search_type == "3":
+            keyword_search()
+        elif search_type == "2":
+            college: str = college_input()
+            sending_key: str = input("Enter the course (e.g. MATH 1A): ").strip().upper()
+            print_reverse_articulations(college, " ".join(sending_key.split()))
+        else:
+            university: str = university_input()
+            subject: dict = subject_input(university)
+            course: dict = handle_courses(university, subject)
+            print_articulations(course)
 
         proceed = input("\nContinue? (y/n) ")
         if proceed.lower() != "y":
             break
 
 
+def main():
+    parser = argparse.ArgumentParser(description="Search articulations from the data folder.")
+    parser.add_argument("--batch", nargs="?", const="-", metavar="FILE",
+                        help="answer JSON-lines queries from FILE (or stdin) instead of prompting")
+    args = parser.parse_args()
+
+    if args.batch is None:
+        interactive()
+    elif args.batch == "-":
+        run_batch(sys.stdin)
+    else:
+        with open(args.batch, "r") as f:
+            run_batch(f)
+
+
 if __name__ == "__main__":
     main()
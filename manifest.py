@@ -0,0 +1,72 @@
+import hashlib
+import json
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from files import write_json
+from pathlib import Path
+
+MANIFEST_PATH = Path("data/manifest.json")
+DEFAULT_MAX_AGE_DAYS = 30
+
+
+def manifest_key(college_id: int, university_id: int) -> str:
+    return f"{college_id}/{university_id}"
+
+
+# Hashes the response body as it came from ASSIST (or the response cache), which is much cheaper than serializing the
+# decoded agreement again.
+def hash_agreement(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def make_entry(college_id: int, university_id: int, year_id: int, method: str | None, content_hash: str | None) -> dict:
+    return {
+        "college_id": college_id,
+        "university_id": university_id,
+        "year_id": year_id,
+        "method": method,
+        "content_hash": content_hash,
+        "fetched_at": datetime.now(timezone.utc).isoformat(timespec="seconds")
+    }
+
+
+# Entries written by offline replays without an earlier entry don't know when the agreement was fetched, so they're
+# never fresh.
+def is_fresh(entry: dict | None, year_id: int, max_age_days: float) -> bool:
+    if entry is None or entry.get("year_id") != year_id or entry.get("fetched_at") is None:
+        return False
+
+    fetched_at = datetime.fromisoformat(entry["fetched_at"])
+    return datetime.now(timezone.utc) - fetched_at < timedelta(days=max_age_days)
+
+
+def is_known_empty(entry: dict | None, year_id: int, max_age_days: float) -> bool:
+    return is_fresh(entry, year_id, max_age_days) and entry.get("method") is None
+
+
+def get_university_method(manifest: dict[str, dict], university_id: int) -> str | None:
+    methods = Counter(
+        entry["method"] for entry in manifest.values()
+        if entry["university_id"] == university_id and entry.get("method") is not None
+    )
+
+    if not methods:
+        return None
+
+    return methods.most_common(1)[0][0]
+
+
+def load_manifest() -> dict[str, dict]:
+    if not MANIFEST_PATH.exists():
+        return {}
+
+    try:
+        with open(MANIFEST_PATH, "r") as f:
+            return json.load(f)
+    except json.decoder.JSONDecodeError:
+        return {}
+
+
+def save_manifest(manifest: dict[str, dict]) -> None:
+    write_json(MANIFEST_PATH, manifest)
@@ -1,19 +1,376 @@
+import gzip
+import hashlib
+import instrumentation
+import json
 import requests
+import threading
 import time
 
+from collections import deque
+from files import write_atomic, write_json
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry, make_headers
+
+QUOTA_EXCEEDED_MESSAGE = "API calls quota exceeded!"
+QUOTA_RETRY_AFTER = 30
+
+# ASSIST says the quota is 50 requests per 5 minutes, but it seems like they allow around 100 rather than just 50.
+# That's only where we start: the limit is adjusted as we go and the learned value is saved for the next run.
+RATE_LIMIT = 100
+RATE_PERIOD = 5 * 60
+MIN_RATE_LIMIT = 20
+MAX_RATE_LIMIT = 300
+RATE_INCREASE = 5
+RATE_DECREASE = 0.75
+RATE_LIMIT_PATH = Path("rate_limit.json")
+BURST = 10
+
+# (connect, read) in seconds. Whole-agreement responses can take a while to come back.
+TIMEOUT = (10, 60)
+
+# Retries for dropped connections and server errors. Quota errors come back as a 200 and are handled in get(). urllib3
+# makes these inside a single session.get, so get() charges them to the rate limiter afterwards.
+RETRIES = Retry(
+    total=5,
+    backoff_factor=2,
+    status_forcelist=[500, 502, 503, 504],
+    allowed_methods=["GET"],
+    raise_on_status=False
+)
+
+CACHE_DIR = Path("cache")
+# Online runs only reuse responses from the last day so weekly refreshes still see new data. Offline replays
+# use everything that's cached.
+CACHE_TTL = 24 * 60 * 60
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+
+class RateLimiter:
+    def __init__(self, limit: float, period: float, capacity: int):
+        self.limit = float(limit)
+        self.period = period
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.resume_at = 0.0
+        self.decreased_at = 0.0
+        self.window: deque[float] = deque()
+        self.lock = threading.Lock()
+
+        self.successes = 0
+        self.sent = 0
+        self.quota_hits = 0
+        # Wall time during which at least one thread was waiting. Adding up every thread's waits would count the same
+        # second once per worker.
+        self.waited = 0.0
+        self.waiting = 0
+        self.waiting_since = 0.0
+        self.started: float | None = None
+
+    @property
+    def rate(self) -> float:
+        return self.limit / self.period
+
+    # Returns how long the caller had to wait.
+    def acquire(self) -> float:
+        waited = 0.0
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                while self.window and now - self.window[0] >= self.period:
+                    self.window.popleft()
+
+                # The token bucket spreads requests out, and the window makes sure we never go over the limit
+                # within any period even after a burst.
+                wait = max(0.0, self.resume_at - now)
+                if self.tokens < 1:
+                    wait = max(wait, (1 - self.tokens) / self.rate)
+                if len(self.window) >= self.limit:
+                    wait = max(wait, self.period - (now - self.window[0]))
+
+                if wait <= 0:
+                    self.tokens -= 1
+                    self.window.append(now)
+                    self.sent += 1
+                    if self.started is None:
+                        self.started = now
+                    return waited
+
+                if self.waiting == 0:
+                    self.waiting_since = now
+                self.waiting += 1
+
+            time.sleep(wait)
+            waited += wait
+
+            with self.lock:
+                self.waiting -= 1
+                if self.waiting == 0:
+                    self.waited += time.monotonic() - self.waiting_since
+
+    # Requests urllib3 retried on its own never went through acquire(), but ASSIST still counted them. They're charged
+    # now, as if they'd just been sent, so the bucket and the window match what actually went out.
+    def record_retries(self, count: int) -> None:
+        if count == 0:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens -= count
+            self.window.extend([now] * count)
+            self.sent += count
+
+    # AIMD: every full window of requests without a quota error raises the limit a little, and a quota error cuts it to
+    # a fraction of what we actually sent in the last period, which is more than ASSIST allows. Requests that were
+    # already in flight when the limit was cut come back with quota errors too, but they belong to the same episode,
+    # so only requests sent after the last cut can cut it again.
+    def record_success(self) -> None:
+        with self.lock:
+            self.successes += 1
+
+            if self.successes >= self.limit:
+                self.successes = 0
+                self.limit = min(MAX_RATE_LIMIT, self.limit + RATE_INCREASE)
+
+    def record_quota_exceeded(self, retry_after: float, sent_at: float) -> None:
+        with self.lock:
+            self.quota_hits += 1
+            self.successes = 0
+            self.tokens = min(self.tokens, 0.0)
+
+            if sent_at >= self.decreased_at:
+                self.limit = max(MIN_RATE_LIMIT, min(self.limit, len(self.window)) * RATE_DECREASE)
+                self.decreased_at = time.monotonic()
+
+            # Holding everyone off makes every waiting thread back off, not just the one that hit the quota.
+            self.resume_at = max(self.resume_at, time.monotonic() + retry_after)
+
+    def pause(self, seconds: float) -> None:
+        with self.lock:
+            self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+
+    def requests_per_minute(self) -> float:
+        if self.started is None:
+            return 0.0
+
+        elapsed = time.monotonic() - self.started
+        return self.sent / max(elapsed / 60, 1 / 60)
+
+    def load(self, path: Path) -> None:
+        try:
+            with open(path, "r") as f:
+                learned = json.load(f)
+            limit = float(learned["limit"])
+        except (OSError, KeyError, TypeError, ValueError):
+            return
+
+        self.limit = min(MAX_RATE_LIMIT, max(MIN_RATE_LIMIT, limit))
+
+    def save(self, path: Path) -> None:
+        write_json(path, {"limit": round(self.limit, 1), "period": self.period})
+
+
+class CacheMiss(LookupError):
+    pass
+
+
+# Raw response bodies are stored gzipped under the hash of their content, so the thousands of identical
+# "agreement not found" responses only take up one file. Each URL gets a small pointer file naming its body.
+class ResponseCache:
+    def __init__(self, directory: Path, ttl: float, max_bytes: int):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self.offline = False
+
+        self.hits = 0
+
+    def url_path(self, url: str) -> Path:
+        digest = hashlib.sha256(url.encode()).hexdigest()
+        return self.directory / "urls" / digest[:2] / digest
+
+    def object_path(self, content_hash: str) -> Path:
+        return self.directory / "objects" / content_hash[:2] / f"{content_hash}.gz"
+
+    def load(self, url: str) -> bytes | None:
+        pointer = self.url_path(url)
+
+        try:
+            if not self.offline and time.time() - pointer.stat().st_mtime > self.ttl:
+                return None
+
+            content_hash = pointer.read_text().strip()
+            with gzip.open(self.object_path(content_hash), "rb") as f:
+                body = f.read()
+        except (OSError, EOFError):
+            return None
+
+        self.hits += 1
+        return body
+
+    def store(self, url: str, body: bytes) -> None:
+        content_hash = hashlib.sha256(body).hexdigest()
+        obj = self.object_path(content_hash)
+
+        if not obj.exists():
+            write_atomic(obj, gzip.compress(body))
+
+        write_atomic(self.url_path(url), content_hash.encode())
+
+    def evict(self) -> None:
+        pointers = list((self.directory / "urls").glob("*/*"))
+        objects = {p.name.removesuffix(".gz"): p for p in (self.directory / "objects").glob("*/*.gz")}
+
+        last_used: dict[str, float] = {}
+        for pointer in pointers:
+            content_hash = pointer.read_text().strip()
+            last_used[content_hash] = max(last_used.get(content_hash, 0.0), pointer.stat().st_mtime)
+
+        # Oldest bodies go first until we're under the size limit.
+        sizes = {h: p.stat().st_size for h, p in objects.items()}
+        total = sum(sizes.values())
+        for content_hash in sorted(sizes, key=lambda h: last_used.get(h, 0.0)):
+            if total <= self.max_bytes and content_hash in last_used:
+                continue
+
+            objects.pop(content_hash).unlink(missing_ok=True)
+            total -= sizes[content_hash]
+
+        for pointer in pointers:
+            if pointer.read_text().strip() not in objects:
+                pointer.unlink(missing_ok=True)
+
+
+limiter = RateLimiter(RATE_LIMIT, RATE_PERIOD, BURST)
+cache = ResponseCache(CACHE_DIR, CACHE_TTL, CACHE_MAX_BYTES)
+timeout: tuple[float, float] = TIMEOUT
+
+# Each worker thread keeps its own session (and so its own keep-alive connection to ASSIST), since sessions aren't
+# guaranteed to be thread-safe.
+sessions = threading.local()
+
+
+def get_session() -> requests.Session:
+    session = getattr(sessions, "session", None)
+
+    if session is None:
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(max_retries=RETRIES))
+        session.mount("http://", HTTPAdapter(max_retries=RETRIES))
+        # Only advertises brotli if a decoder for it is installed.
+        session.headers["Accept-Encoding"] = make_headers(accept_encoding=True)["accept-encoding"]
+        sessions.session = session
+
+    return session
+
+
+def cached_response(url: str, body: bytes) -> requests.Response:
+    response = requests.Response()
+    response._content = body
+    response.status_code = 200
+    response.url = url
+    response.encoding = "utf-8"
+
+    return response
+
+
+def get_retry_after(response: requests.Response) -> float | None:
+    try:
+        return max(0.0, float(response.headers["Retry-After"]))
+    except (KeyError, ValueError):
+        return None
+
+
+def count_retries(response: requests.Response) -> int:
+    retries = getattr(getattr(response, "raw", None), "retries", None)
+    return 0 if retries is None else len(retries.history)
+
+
+# Counts a response towards whatever span is active. Retries are the ones urllib3 made before this response came back,
+# and wire bytes are what actually came over the network before decompression.
+def record_response(response: requests.Response) -> None:
+    instrumentation.count("requests")
+    instrumentation.count("bytes", len(response.content))
+
+    raw = getattr(response, "raw", None)
+    if hasattr(raw, "tell"):
+        instrumentation.count("wire_bytes", raw.tell())
+
+    retries = getattr(raw, "retries", None)
+    if retries is not None:
+        instrumentation.count("retries", len(retries.history))
+
 
 def get(url: str, params=None, **kwargs) -> requests.Response:
+    cache_url = requests.Request("GET", url, params=params).prepare().url
+
+    if cache.enabled:
+        with instrumentation.stage("cache"):
+            body = cache.load(cache_url)
+
+        if body is not None:
+            instrumentation.count("cache_hits")
+            return cached_response(url, body)
+
+    if cache.offline:
+        raise CacheMiss(f"{cache_url} is not in the response cache.")
+
     while True:
-        response: requests.Response = requests.get(url=url, params=params, **kwargs)
+        instrumentation.add_time("wait", limiter.acquire())
+        sent_at = time.monotonic()
+        kwargs.setdefault("timeout", timeout)
+
+        with instrumentation.stage("download"):
+            response: requests.Response = get_session().get(url=url, params=params, **kwargs)
+
+        record_response(response)
+        limiter.record_retries(count_retries(response))
+        retry_after = get_retry_after(response)
+
+        # Checked on the raw bytes, since response.text decodes the whole body again every time it's read.
+        if not response.content.startswith(QUOTA_EXCEEDED_MESSAGE.encode()) and response.status_code != 429:
+            limiter.record_success()
+
+            # Not something ASSIST has been seen to send, but if it ever tells us we're out, there's no point in
+            # finding out the hard way.
+            if response.headers.get("X-RateLimit-Remaining") == "0":
+                limiter.pause(QUOTA_RETRY_AFTER if retry_after is None else retry_after)
 
-        if response.text != "API calls quota exceeded! maximum admitted 50 per 5m.":
             break
 
-        print("Exceeded rate limit. Retrying request in 30 seconds.")
-        time.sleep(30)
+        retry_after = QUOTA_RETRY_AFTER if retry_after is None else retry_after
+        limiter.record_quota_exceeded(retry_after, sent_at)
+        instrumentation.count("quota_hits")
+        print(f"Exceeded rate limit. Retrying request in {retry_after:g} seconds "
+              f"(now limited to {limiter.limit:.0f} requests per {limiter.period / 60:g} minutes).")
 
-    # It seems like they allow around 100 requests rather than just 50.
-    # 3 seconds will occasionally exceed the rate limit but 4 is safer.
-    time.sleep(3)
+    if cache.enabled and response.status_code == 200:
+        with instrumentation.stage("cache"):
+            cache.store(cache_url, response.content)
 
     return response
+
+
+def load_rate_limit() -> None:
+    limiter.load(RATE_LIMIT_PATH)
+
+
+def save_rate_limit() -> None:
+    if limiter.sent > 0:
+        limiter.save(RATE_LIMIT_PATH)
+
+
+def print_stats() -> None:
+    budget = limiter.limit / (limiter.period / 60)
+    print(f"Requests sent: {limiter.sent} ({limiter.requests_per_minute():.1f}/min, budget {budget:.1f}/min)")
+    print(f"Quota errors: {limiter.quota_hits}")
+    print(f"Time spent waiting on the rate limit: {limiter.waited:.0f} seconds")
+
+    if cache.enabled:
+        print(f"Cache hits: {cache.hits}")
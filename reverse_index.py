@@ -0,0 +1,98 @@
+import json
+
+from files import write_json
+from pathlib import Path
+
+REVERSE_DIR = Path("data/reverse")
+
+
+def get_university_names() -> list[str]:
+    with open(Path("data/institutions.json"), "r") as file:
+        institutions: list[dict] = json.load(file)
+
+    names = [i["name"] for i in institutions if i["category"] != "CCC"]
+    return sorted(name for name in names if Path(f"data/{name}/subjects.json").exists())
+
+
+def collect_sending_keys(node: dict | None, out: set[str]) -> None:
+    if not node:
+        return
+
+    for item in node.get("items") or []:
+        if item.get("type") in ("SET", "GROUP"):
+            collect_sending_keys(item, out)
+        else:
+            out.add(item["key"])
+
+
+def add_university_to_index(university_name: str, index: dict[str, dict[str, list[list[str]]]]) -> None:
+    with open(Path(f"data/{university_name}/subjects.json"), "r") as file:
+        subjects: list[dict] = json.load(file)
+
+    # Series show up under every prefix they contain, so only index each receiving key once.
+    seen: set[tuple[str, str]] = set()
+
+    for subject in subjects:
+        courses_path = Path(f"data/{university_name}/{subject['prefix']}/courses.json")
+        if not courses_path.exists():
+            continue
+
+        with open(courses_path, "r") as file:
+            rows: list[dict] = json.load(file)
+
+        add_subject_to_index(university_name, subject["prefix"], rows, index, seen)
+
+
+def add_subject_to_index(
+    university_name: str,
+    subject_prefix: str,
+    rows: list[dict],
+    index: dict[str, dict[str, list[list[str]]]],
+    seen: set[tuple[str, str]]
+) -> None:
+    for row in rows:
+        for articulation in row.get("articulations") or []:
+            college_name = articulation["sending_name"]
+            if (college_name, row["key"]) in seen:
+                continue
+            seen.add((college_name, row["key"]))
+
+            sending_keys: set[str] = set()
+            collect_sending_keys(articulation["sending_articulation"], sending_keys)
+
+            college_index = index.setdefault(college_name, {})
+            for sending_key in sending_keys:
+                college_index.setdefault(sending_key, []).append([university_name, subject_prefix, row["key"]])
+
+
+def build_reverse_index() -> None:
+    print("Building reverse articulation index.")
+
+    index: dict[str, dict[str, list[list[str]]]] = {}
+    for university_name in get_university_names():
+        add_university_to_index(university_name, index)
+
+    for college_name, college_index in index.items():
+        payload = {key: sorted(college_index[key]) for key in sorted(college_index.keys())}
+        write_json(reverse_index_path(college_name), payload)
+
+
+def reverse_index_path(college_name: str) -> Path:
+    return REVERSE_DIR / f"{college_name}.json"
+
+
+def load_reverse_index(college_name: str) -> dict[str, list[list[str]]]:
+    index_path = reverse_index_path(college_name)
+    if not index_path.exists():
+        return {}
+
+    with open(index_path, "r") as file:
+        return json.load(file)
+
+
+def get_reverse_articulations(college_name: str, sending_key: str) -> list[list[str]]:
+    return load_reverse_index(college_name).get(sending_key, [])
+
+
+if __name__ == "__main__":
+    build_reverse_index()
@@ -14,11 +14,15 @@ const courseLoader = document.getElementById("course-loader");
 const DATA_PATHS = {
     institutions: "./data/institutions.json",
     subjects: (universityName) => `./data/${encodeURIComponent(universityName)}/subjects.json`,
-    courses: (universityName, subjectCode) => `./data/${encodeURIComponent(universityName)}/${encodeURIComponent(subjectCode)}/courses.json`
+    courses: (universityName, subjectCode) => `./data/${encodeURIComponent(universityName)}/${encodeURIComponent(subjectCode)}/courses.json`,
+    catalog: (universityName) => `./data/bundles/${encodeURIComponent(universityName)}/catalog.json`,
+    shard: (universityName, subjectCode, shard) => `./data/bundles/${encodeURIComponent(universityName)}/${encodeURIComponent(subjectCode)}/${shard}.json`
 }
 
 const SUBJECT_CACHE = new Map();
 const COURSE_CACHE = new Map();
+const CATALOG_CACHE = new Map();
+const SHARD_CACHE = new Map();
 
 async function getJson(url) {
     const res = await fetch(url)
@@ -60,12 +64,25 @@ async function fetchInstitutions() {
     return getJson(DATA_PATHS.institutions)
 }
 
+// Bundles are written by bundles.py. When a university doesn't have one yet, fall back to the full data files.
+async function fetchCatalog(universityName) {
+    if (!CATALOG_CACHE.has(universityName)) {
+        const res = await fetch(DATA_PATHS.catalog(universityName));
+        CATALOG_CACHE.set(universityName, res.ok ? await res.json() : null);
+    }
+
+    return CATALOG_CACHE.get(universityName);
+}
+
 async function fetchSubjects(universityName) {
     console.log("Fetching subjects for university:", universityName);
 
     let list = SUBJECT_CACHE.get(universityName);
     if (!list) {
-        list = await getJson(DATA_PATHS.subjects(universityName))
+        const catalog = await fetchCatalog(universityName);
+        list = catalog
+            ? catalog.map(({prefix, name}) => ({prefix, name}))
+            : await getJson(DATA_PATHS.subjects(universityName));
         SUBJECT_CACHE.set(universityName, list);
     }
 
@@ -82,19 +99,47 @@ async function fetchCourses(universityName, subjectCode) {
 
     let list = COURSE_CACHE.get(key);
     if (!list) {
-        list = await getJson(DATA_PATHS.courses(universityName, subjectCode));
+        const catalog = await fetchCatalog(universityName);
+        if (catalog) {
+            const subject = catalog.find(s => s.prefix === subjectCode);
+            list = subject ? subject.courses : [];
+        } else {
+            const rows = await getJson(DATA_PATHS.courses(universityName, subjectCode));
+            list = rows.map(row => ({key: row.key, label: buildCourseFullLabel(row), row}));
+        }
         COURSE_CACHE.set(key, list)
     }
 
     return list
 }
 
+async function fetchShard(universityName, subjectCode, shard) {
+    const key = `${coursesCacheKey(universityName, subjectCode)}|${shard}`;
+
+    let articulations = SHARD_CACHE.get(key);
+    if (!articulations) {
+        articulations = await getJson(DATA_PATHS.shard(universityName, subjectCode, shard));
+        SHARD_CACHE.set(key, articulations);
+    }
+
+    return articulations;
+}
+
 async function fetchArticulations(universityName, subjectCode, courseKey) {
     const list = await fetchCourses(universityName, subjectCode);
     const course = (list || []).find(c => c.key === courseKey);
-    const courseFull = buildCourseFullLabel(course);
-    const articulations = course ? normalizeArticulations(course) : [];
-    return {courseFull, articulations};
+
+    if (!course) {
+        return {courseFull: "", articulations: []};
+    }
+
+    let row = course.row;
+    if (!row) {
+        const shard = course.shard === undefined ? {} : await fetchShard(universityName, subjectCode, course.shard);
+        row = {articulations: shard[courseKey] || []};
+    }
+
+    return {courseFull: course.label, articulations: normalizeArticulations(row)};
 }
 
 async function populateUniversities() {
@@ -199,22 +244,7 @@ async function populateCourses(universityId, subjectCode) {
         courses.forEach(course => {
             const option = document.createElement("option");
             option.value = course.key;
-
-            option.textContent = `${course.key}`;
-
-            if (course.type === "COURSE") {
-                option.textContent += ` - ${course.title}`
-            } else if (course.type === "SERIES") {
-                option.textContent += ` - `
-                for (let i = 0; i < course.courses.length; i++) {
-                    option.textContent += course.courses[i].title;
-
-                    if (i !== course.courses.length - 1) {
-                        option.textContent += ", "
-                    }
-                }
-            }
-
+            option.textContent = course.label;
             courseSelect.appendChild(option);
         });
 
@@ -0,0 +1,195 @@
+import argparse
+import json
+import re
+
+from bisect import bisect_left
+from files import write_json
+from pathlib import Path
+from reverse_index import get_university_names
+
+SEARCH_DIR = Path("data/search")
+INDEX_PATH = SEARCH_DIR / "index.json"
+DEFAULT_LIMIT = 20
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Documents are stored as [kind, institution, subject, key, title]. Receiving documents are university courses and
+# sending documents are community college courses, which don't belong to a subject.
+RECEIVING = "R"
+SENDING = "S"
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def partial_path(university_name: str, subject_dir: str) -> Path:
+    return SEARCH_DIR / university_name / f"{subject_dir}.json"
+
+
+def receiving_title(row: dict) -> str:
+    if row["type"] == "SERIES":
+        return ", ".join(course["title"] for course in row["courses"])
+
+    return row.get("title") or ""
+
+
+def collect_sending_courses(node: dict | None, out: dict[str, str]) -> None:
+    if not node:
+        return
+
+    for item in node.get("items") or []:
+        if item.get("type") in ("SET", "GROUP"):
+            collect_sending_courses(item, out)
+        else:
+            out.setdefault(item["key"], item.get("title") or "")
+
+
+def subject_documents(rows: list[dict]) -> dict:
+    receiving: list[list[str]] = []
+    sending: dict[str, dict[str, str]] = {}
+
+    for row in rows:
+        receiving.append([row["key"], receiving_title(row)])
+
+        for articulation in row.get("articulations") or []:
+            college_courses = sending.setdefault(articulation["sending_name"], {})
+            collect_sending_courses(articulation["sending_articulation"], college_courses)
+
+    return {
+        "receiving": receiving,
+        "sending": [[college, key, title] for college, courses in sorted(sending.items())
+                    for key, title in sorted(courses.items())]
+    }
+
+
+# The documents of one subject, saved separately so a crawl only has to redo the subjects it changed.
+def index_rows(university_name: str, subject_dir: str, rows: list[dict]) -> dict:
+    partial = subject_documents(rows)
+    write_json(partial_path(university_name, subject_dir), partial, compact=True)
+
+    return partial
+
+
+def index_subject(university_name: str, subject_dir: str) -> dict | None:
+    courses_path = Path(f"data/{university_name}/{subject_dir}/courses.json")
+    if not courses_path.exists():
+        partial_path(university_name, subject_dir).unlink(missing_ok=True)
+        return None
+
+    with open(courses_path, "r") as f:
+        return index_rows(university_name, subject_dir, json.load(f))
+
+
+def load_partial(university_name: str, subject_dir: str, rebuild: bool) -> dict | None:
+    path = partial_path(university_name, subject_dir)
+    if rebuild or not path.exists():
+        return index_subject(university_name, subject_dir)
+
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def build_search_index(rebuild: bool = False) -> None:
+    print("Building course search index.")
+
+    docs: list[list[str | None]] = []
+    seen: set[tuple[str, str, str]] = set()
+
+    for university_name in get_university_names():
+        with open(Path(f"data/{university_name}/subjects.json"), "r") as f:
+            subjects: list[dict] = json.load(f)
+
+        # Partials are written by the crawl whenever it writes a subject, so normally none of them need building here.
+        for subject in subjects:
+            partial = load_partial(university_name, subject["prefix"], rebuild)
+            if partial is None:
+                continue
+
+            add_documents(university_name, subject["prefix"], partial, docs, seen)
+
+    write_json(INDEX_PATH, make_index(docs), compact=True)
+
+
+def add_documents(
+    university_name: str,
+    subject_prefix: str,
+    partial: dict,
+    docs: list[list[str | None]],
+    seen: set[tuple[str, str, str]]
+) -> None:
+    # Series are listed under every prefix they contain, and colleges under every subject they articulate to.
+    for key, title in partial["receiving"]:
+        if (RECEIVING, university_name, key) not in seen:
+            seen.add((RECEIVING, university_name, key))
+            docs.append([RECEIVING, university_name, subject_prefix, key, title])
+
+    for college_name, key, title in partial["sending"]:
+        if (SENDING, college_name, key) not in seen:
+            seen.add((SENDING, college_name, key))
+            docs.append([SENDING, college_name, None, key, title])
+
+
+def make_index(docs: list[list[str | None]]) -> dict:
+    postings: dict[str, list[int]] = {}
+    for doc_id, (_, _, _, key, title) in enumerate(docs):
+        for token in set(tokenize(f"{key} {title}")):
+            postings.setdefault(token, []).append(doc_id)
+
+    tokens = sorted(postings)
+    return {"docs": docs, "tokens": tokens, "postings": [postings[t] for t in tokens]}
+
+
+class SearchIndex:
+    def __init__(self, payload: dict):
+        self.docs: list[list[str | None]] = payload["docs"]
+        self.tokens: list[str] = payload["tokens"]
+        self.postings: list[list[int]] = payload["postings"]
+
+    # Scores every document containing a word that starts with the query token. Whole-word matches count double.
+    def match(self, query_token: str) -> dict[int, int]:
+        scores: dict[int, int] = {}
+
+        i = bisect_left(self.tokens, query_token)
+        while i < len(self.tokens) and self.tokens[i].startswith(query_token):
+            score = 2 if self.tokens[i] == query_token else 1
+            for doc_id in self.postings[i]:
+                if scores.get(doc_id, 0) < score:
+                    scores[doc_id] = score
+            i += 1
+
+        return scores
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT) -> list[list[str | None]]:
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return []
+
+        # Every query token has to match. Start from the rarest so the intersection stays small.
+        matches = sorted((self.match(token) for token in set(query_tokens)), key=len)
+        scores = matches[0]
+        for other in matches[1:]:
+            scores = {doc_id: score + other[doc_id] for doc_id, score in scores.items() if doc_id in other}
+
+        def rank(doc_id: int):
+            kind, institution, _, key, title = self.docs[doc_id]
+            return -scores[doc_id], kind != RECEIVING, len(title), institution, key
+
+        return [self.docs[doc_id] for doc_id in sorted(scores, key=rank)[:limit]]
+
+
+def load_search_index(path: Path = INDEX_PATH) -> SearchIndex:
+    with open(path, "r") as f:
+        return SearchIndex(json.load(f))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the course search index from the data folder.")
+    parser.add_argument("--rebuild", action="store_true", help="reindex every subject instead of only ones without a saved index")
+    args = parser.parse_args()
+
+    build_search_index(args.rebuild)
+
+
+if __name__ == "__main__":
+    main()
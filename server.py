@@ -0,0 +1,207 @@
+import argparse
+import hashlib
+import json
+import threading
+
+from collections import OrderedDict
+from corpus import CORPUS_PATH, Corpus, load_corpus, load_data_folder
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from main import format_node, key_variants
+from pathlib import Path
+from reverse_index import add_subject_to_index
+from search_index import DEFAULT_LIMIT, SearchIndex, add_documents, make_index, subject_documents
+from urllib.parse import parse_qs, urlsplit
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+RESPONSE_CACHE_SIZE = 1024
+MAX_SEARCH_LIMIT = 200
+
+
+class QueryError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# Everything the endpoints need, built once at startup. The corpus stores each distinct value once, and decoding it
+# keeps that sharing, so the whole data folder fits in a few hundred MB instead of several GB of parsed JSON.
+class ArticulationData:
+    def __init__(self, corpus: Corpus):
+        self.courses: dict[str, dict[str, dict]] = {}
+        self.reverse: dict[str, dict[str, list[list[str]]]] = {}
+
+        docs: list[list[str | None]] = []
+        seen_docs: set[tuple[str, str, str]] = set()
+
+        for institution in corpus.get_institutions():
+            university_name = institution["name"]
+            if institution["category"] == "CCC" or not corpus.has(f"{university_name}/subjects.json"):
+                continue
+
+            university_courses = self.courses.setdefault(university_name, {})
+            seen_reverse: set[tuple[str, str]] = set()
+
+            for subject in corpus.get_subjects(university_name):
+                if not corpus.has(f"{university_name}/{subject['prefix']}/courses.json"):
+                    continue
+
+                rows = corpus.get_courses(university_name, subject["prefix"])
+                for row in rows:
+                    university_courses.setdefault(row["key"], row)
+
+                add_subject_to_index(university_name, subject["prefix"], rows, self.reverse, seen_reverse)
+                add_documents(university_name, subject["prefix"], subject_documents(rows), docs, seen_docs)
+
+        for college_index in self.reverse.values():
+            for matches in college_index.values():
+                matches.sort()
+
+        self.search_index = SearchIndex(make_index(docs))
+
+    def get_course(self, university_name: str, key: str) -> dict:
+        university_courses = self.courses.get(university_name)
+        if university_courses is None:
+            raise QueryError(HTTPStatus.NOT_FOUND, "Unknown university.")
+
+        for variant in key_variants(key):
+            if variant in university_courses:
+                return university_courses[variant]
+
+        raise QueryError(HTTPStatus.NOT_FOUND, "Course not found.")
+
+    def get_reverse(self, college_name: str, key: str, university_name: str | None) -> list[list[str]]:
+        college_index = self.reverse.get(college_name)
+        if college_index is None:
+            raise QueryError(HTTPStatus.NOT_FOUND, "Unknown college.")
+
+        matches = next((college_index[v] for v in key_variants(key) if v in college_index), [])
+
+        if university_name is not None:
+            matches = [match for match in matches if match[0] == university_name]
+
+        return matches
+
+
+def course_text(course: dict) -> str:
+    lines = [f"=== Articulations for {course['key']} ==="]
+
+    if len(course["articulations"]) == 0:
+        lines.append("This requirement has no articulations at any CCCs.")
+
+    for articulation in course["articulations"]:
+        lines.append(f"\nFrom: {articulation['sending_name']}")
+        lines.append(format_node(articulation["sending_articulation"]))
+
+    return "\n".join(lines) + "\n"
+
+
+def reverse_text(matches: list[list[str]]) -> str:
+    return "".join(f"{university}: {receiving_key}\n" for university, _, receiving_key in matches)
+
+
+def search_text(matches: list[list[str | None]]) -> str:
+    return "".join(f"{key} - {title} ({institution})\n" for _, institution, _, key, title in matches)
+
+
+class Handler(BaseHTTPRequestHandler):
+    data: ArticulationData
+
+    # Answers never change while the server is up, so rendered responses are kept (up to a limit) by their URL.
+    cache: OrderedDict[str, tuple[bytes, str, str]] = OrderedDict()
+    cache_lock = threading.Lock()
+
+    def do_GET(self) -> None:
+        with self.cache_lock:
+            cached = self.cache.get(self.path)
+            if cached is not None:
+                self.cache.move_to_end(self.path)
+
+        if cached is None:
+            try:
+                body, content_type = self.render()
+            except QueryError as e:
+                self.send_error(e.status, str(e))
+                return
+
+            etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+            cached = (body, content_type, etag)
+
+            with self.cache_lock:
+                self.cache[self.path] = cached
+                while len(self.cache) > RESPONSE_CACHE_SIZE:
+                    self.cache.popitem(last=False)
+
+        body, content_type, etag = cached
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def render(self) -> tuple[bytes, str]:
+        url = urlsplit(self.path)
+        params = {name: values[0] for name, values in parse_qs(url.query).items()}
+
+        def param(name: str) -> str:
+            if not params.get(name):
+                raise QueryError(HTTPStatus.BAD_REQUEST, f"Missing the {name} parameter.")
+            return params[name]
+
+        if url.path == "/course":
+            result = self.data.get_course(param("university"), param("key"))
+            to_text = course_text
+        elif url.path == "/reverse":
+            result = self.data.get_reverse(param("college"), param("key"), params.get("university"))
+            to_text = reverse_text
+        elif url.path == "/search":
+            try:
+                limit = int(params.get("limit", DEFAULT_LIMIT))
+            except ValueError:
+                raise QueryError(HTTPStatus.BAD_REQUEST, "The limit parameter must be a number.")
+
+            result = self.data.search_index.search(param("q"), max(1, min(limit, MAX_SEARCH_LIMIT)))
+            to_text = search_text
+        else:
+            raise QueryError(HTTPStatus.NOT_FOUND, "Unknown endpoint. Use /course, /reverse or /search.")
+
+        if params.get("format") == "text":
+            return to_text(result).encode(), "text/plain; charset=utf-8"
+
+        return json.dumps(result, separators=(",", ":")).encode(), "application/json"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve articulation lookups over HTTP from the local data.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--corpus", nargs="?", const=str(CORPUS_PATH), metavar="PATH",
+                        help="load a corpus.py export instead of the data folder (much faster to start)")
+    args = parser.parse_args()
+
+    print("Loading articulation data.")
+    corpus = load_corpus(Path(args.corpus)) if args.corpus else load_data_folder()
+    Handler.data = ArticulationData(corpus)
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"Serving on http://{args.host}:{args.port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()